@@ -1,19 +1,27 @@
 from passlib.context import CryptContext
-from jose import JWTError, jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
-from models import get_db, User, PasswordResetToken
+from dataclasses import dataclass
+from models import open_async_db, has_read_replica, User, PasswordResetToken
 from config import settings
+from cache import TTLCache
+from mailer import queue_mail
+from metrics import password_hash_duration, password_hash_jobs_in_flight
+import asyncio
+import hashlib
+import math
 import secrets
-import smtplib
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+# python-jose (含 cryptography) 在第一次簽發 / 驗證 token 時才匯入，啟動後由 warm_up 在背景預先載入
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
@@ -24,6 +32,73 @@ def get_password_hash(password: str) -> str:
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
 
+# bcrypt 專用的 executor，讓雜湊工作不會佔用 Starlette 的 threadpool
+_hash_executor: Executor | None = None
+_hash_executor_lock = threading.Lock()
+# 排隊中 + 執行中的雜湊工作數量上限
+_hash_slots = threading.BoundedSemaphore(settings.hash_max_pending)
+
+def get_hash_executor() -> Executor:
+    """取得 (必要時建立) 密碼雜湊用的 executor"""
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            if settings.hash_executor == "process":
+                _hash_executor = ProcessPoolExecutor(max_workers=settings.hash_workers)
+            else:
+                _hash_executor = ThreadPoolExecutor(
+                    max_workers=settings.hash_workers, thread_name_prefix="bcrypt"
+                )
+        return _hash_executor
+
+def shutdown_hash_executor():
+    """關閉密碼雜湊用的 executor"""
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is not None:
+            _hash_executor.shutdown(wait=False, cancel_futures=True)
+            _hash_executor = None
+
+def load_hash_backend() -> str:
+    """載入 bcrypt backend (passlib 第一次使用時會載入並自我測試)"""
+    return pwd_context.handler("bcrypt").get_backend()
+
+def warm_up():
+    """預先載入 JWT 函式庫、建立雜湊 executor 並載入 bcrypt backend，讓第一個登入請求不用等待"""
+    import jose.jwt  # noqa: F401
+
+    get_hash_executor().submit(load_hash_backend).result()
+
+def _timed_hash_call(func, *args):
+    """在 executor 中執行並回傳 (結果, 耗時)，只計算實際雜湊時間、不含排隊 (process executor 也適用)"""
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+async def _run_hash_job(func, *args):
+    # 佇列已滿時直接回 503，不讓請求在後面越堆越多
+    if not _hash_slots.acquire(blocking=False):
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Server busy, please retry later",
+            headers={"Retry-After": "1"},
+        )
+    password_hash_jobs_in_flight.inc()
+    try:
+        loop = asyncio.get_running_loop()
+        result, elapsed = await loop.run_in_executor(get_hash_executor(), _timed_hash_call, func, *args)
+        password_hash_duration.observe(elapsed, func.__name__)
+        return result
+    finally:
+        password_hash_jobs_in_flight.dec()
+        _hash_slots.release()
+
+async def get_password_hash_async(password: str) -> str:
+    return await _run_hash_job(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_hash_job(verify_password, plain_password, hashed_password)
+
 def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -31,10 +106,57 @@ def create_access_token(data: dict, expires_delta: timedelta = None) -> str:
     else:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     to_encode.update({"exp": expire})
+    from jose import jwt
+
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+@dataclass(frozen=True)
+class CurrentUser:
+    """已驗證的用戶 (輕量版，不綁定 DB session)"""
+    id: int
+    email: str
+    name: str
+
+# token -> CurrentUser，每個 worker process 各自一份
+# 快取時間不會超過 token 本身的有效期限；user_cache_ttl 刻意設得很短，它決定了舊 token 在其他 worker 上失效的延遲
+_user_cache = TTLCache(maxsize=settings.user_cache_size, ttl=settings.user_cache_ttl)
+
+def invalidate_cached_user(email: str):
+    """移除該用戶所有已快取的 token (密碼重設或用戶資料更新後呼叫)
+    只影響目前的 worker，其他 worker 的快取在 user_cache_ttl 秒內過期
+    """
+    _user_cache.discard_where(lambda user: user.email == email)
+
+def create_user_access_token(user: User, expires_delta: timedelta = None) -> str:
+    """建立登入用的 access token
+    sub: email (舊版 token 只有這個欄位)
+    uid: 用戶 id，驗證時直接以主鍵查詢
+    ver: token 版本，用戶的 token_version 改變後舊 token 即失效
+    """
+    return create_access_token(
+        data={"sub": user.email, "uid": user.id, "ver": user.token_version},
+        expires_delta=expires_delta,
+    )
+
+def load_user_for_token(db: Session, user_id: int | None, email: str | None):
+    """依 token 內容查詢用戶 (uid 以主鍵查詢，舊版 token 以 email 查詢)"""
+    query = db.query(User.id, User.email, User.name, User.token_version)
+    if user_id is not None:
+        return query.filter(User.id == user_id).first()
+    return query.filter(User.email == email).first()
+
+def _token_matches(row, user_id: int | None, payload: dict) -> bool:
+    # 舊版 token 只有 email，過渡期內仍接受 (不檢查 token 版本)
+    return row is not None and (user_id is None or row.token_version == payload.get("ver"))
+
+async def get_current_user(token: str = Depends(oauth2_scheme)) -> CurrentUser:
+    cached = _user_cache.get(token)
+    if cached is not None:
+        return cached
+
+    from jose import JWTError, jwt
+
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -43,19 +165,71 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
-        if email is None:
+        user_id = payload.get("uid")
+        if email is None and user_id is None:
             raise credentials_exception
     except JWTError:
         raise credentials_exception
-    user = db.query(User).filter(User.email == email).first()
-    if user is None:
+    if user_id is None and not settings.accept_legacy_tokens:
         raise credentials_exception
+    async with open_async_db(read_only=True) as db:
+        row = await db.run_sync(load_user_for_token, user_id, email)
+    if has_read_replica and not _token_matches(row, user_id, payload):
+        # 副本可能還沒同步剛註冊的用戶或新的 token 版本，以主資料庫為準
+        async with open_async_db() as db:
+            row = await db.run_sync(load_user_for_token, user_id, email)
+    if not _token_matches(row, user_id, payload):
+        raise credentials_exception
+    user = CurrentUser(id=row.id, email=row.email, name=row.name)
+    expires_at = payload.get("exp")
+    _user_cache.set(token, user, ttl=expires_at - time.time() if expires_at else None)
     return user
 
+# read-your-writes：最後一次寫入的時間由用戶端帶著 (cookie，或由用戶端轉送的 X-Last-Write header)，
+# 不論請求被分配到哪個 worker 都能判斷；期間內的讀取改走主資料庫
+LAST_WRITE_COOKIE = "last_write"
+LAST_WRITE_HEADER = "X-Last-Write"
+
+def wrote_recently(request: Request) -> bool:
+    """請求附帶的最後寫入時間是否在 read_your_writes_seconds 內"""
+    try:
+        last_write = float(request.cookies.get(LAST_WRITE_COOKIE) or request.headers.get(LAST_WRITE_HEADER))
+    except (TypeError, ValueError):
+        return False
+    # 取絕對值：容忍多台主機之間的時間誤差，也不讓偽造的未來時間延長期限
+    return abs(time.time() - last_write) < settings.read_your_writes_seconds
+
+def mark_write(response: Response):
+    """在回應附上這次寫入的時間；前端與 API 不同網域時，cookie 需 SameSite=None 與 Secure 才會送回"""
+    last_write = f"{time.time():.3f}"
+    secure = settings.environment == "production"
+    response.set_cookie(
+        LAST_WRITE_COOKIE, last_write, max_age=math.ceil(settings.read_your_writes_seconds),
+        httponly=True, secure=secure, samesite="none" if secure else "lax",
+    )
+    response.headers[LAST_WRITE_HEADER] = last_write
+
+async def get_read_db(request: Request):
+    """唯讀路由的 DB session：連到唯讀副本，用戶在 read_your_writes_seconds 內寫入過時改連主資料庫"""
+    async with open_async_db(read_only=not wrote_recently(request)) as db:
+        yield db
+
+async def get_write_db(response: Response):
+    """會寫入資料的路由：連到主資料庫，並讓該用戶接下來的讀取暫時也走主資料庫"""
+    if has_read_replica:
+        # 需在路由回傳前設定 (yield 之後回應可能已送出)；時間取寫入開始前，期間會比實際寫入完成時稍早開始計算
+        mark_write(response)
+    async with open_async_db() as db:
+        yield db
+
 def generate_reset_token() -> str:
     """生成密碼重設 token"""
     return secrets.token_urlsafe(32)
 
+def hash_reset_token(token: str) -> bytes:
+    """資料庫只儲存 token 的 SHA-256 digest (固定 32 bytes)"""
+    return hashlib.sha256(token.encode()).digest()
+
 def create_password_reset_token(email: str, db: Session) -> str | None:
     """建立密碼重設 token 並儲存到資料庫"""
     # 檢查用戶是否存在
@@ -70,7 +244,7 @@ def create_password_reset_token(email: str, db: Session) -> str | None:
     # 儲存到資料庫
     reset_token = PasswordResetToken(
         email=email,
-        token=token,
+        token_hash=hash_reset_token(token),
         expires_at=expires_at
     )
     db.add(reset_token)
@@ -78,46 +252,44 @@ def create_password_reset_token(email: str, db: Session) -> str | None:
     
     return token
 
-def verify_reset_token(token: str, db: Session) -> str:
-    """驗證重設 token 並回傳對應的 email"""
-    reset_token = db.query(PasswordResetToken).filter(
-        PasswordResetToken.token == token,
-        PasswordResetToken.used == 0,
-        PasswordResetToken.expires_at > datetime.utcnow()
-    ).first()
+def consume_reset_token(token: str, db: Session) -> str:
+    """以單一條件式 UPDATE 將有效的 token 標記為已使用，並回傳對應的 email
+    同一個 token 被同時使用時只有一個請求會成功 (由呼叫端 commit)
+    """
+    statement = (
+        update(PasswordResetToken)
+        .where(
+            PasswordResetToken.token_hash == hash_reset_token(token),
+            PasswordResetToken.used == 0,
+            PasswordResetToken.expires_at > datetime.utcnow()
+        )
+        .values(used=1)
+        .execution_options(synchronize_session=False)
+    )
+    if db.get_bind().dialect.update_returning:
+        email = db.scalar(statement.returning(PasswordResetToken.email))
+    else:
+        # 不支援 RETURNING 的資料庫：UPDATE 成功後再以同一交易查出 email
+        email = None
+        if db.execute(statement).rowcount == 1:
+            email = db.scalar(
+                select(PasswordResetToken.email)
+                .where(PasswordResetToken.token_hash == hash_reset_token(token))
+            )
     
-    if not reset_token:
+    if email is None:
         raise HTTPException(status_code=400, detail="Invalid or expired token")
     
-    return reset_token.email
+    return email
 
-def mark_token_as_used(token: str, db: Session):
-    """標記 token 為已使用"""
-    reset_token = db.query(PasswordResetToken).filter(PasswordResetToken.token == token).first()
-    if reset_token:
-        reset_token.used = 1
-        db.commit()
-
-def send_reset_email(email: str, token: str):
-    """發送密碼重設郵件"""
+def queue_reset_email(email: str, token: str, db: Session):
+    """將密碼重設郵件加入寄送佇列，由背景的 mail_dispatcher 寄出
+    內文含有原始 token，只在等待寄送期間保存於 outbound_mails (寄出後刪除、放棄重試時清空)
+    """
     # 使用環境變數中的前端 URL
     reset_url = f"{settings.app_url}/reset-password?token={token}"
     
-    # 檢查是否設定了郵件配置
-    if not settings.smtp_username or not settings.smtp_password:
-        # 開發環境：輸出到控制台
-        print(f"密碼重設郵件已發送到 {email}")
-        print(f"重設連結: {reset_url}")
-        return
-    
-    try:
-        # 建立郵件
-        msg = MIMEMultipart()
-        msg['From'] = settings.smtp_from_email or settings.smtp_username
-        msg['To'] = email
-        msg['Subject'] = '密碼重設請求'
-        
-        body = f'''
+    body = f'''
         您好,
         
         您請求重設密碼. 請點擊以下連結重設您的密碼:
@@ -128,21 +300,6 @@ def send_reset_email(email: str, token: str):
         
         如果您沒有請求重設密碼, 請忽略此郵件.
         '''
-        
-        msg.attach(MIMEText(body, 'plain'))
-        
-        # 發送郵件
-        server = smtplib.SMTP(settings.smtp_server, settings.smtp_port)
-        server.starttls()
-        server.login(settings.smtp_username, settings.smtp_password)
-        text = msg.as_string()
-        server.sendmail(settings.smtp_from_email or settings.smtp_username, email, text)
-        server.quit()
-        
-        print(f"密碼重設郵件已成功發送到 {email}")
-        
-    except Exception as e:
-        print(f"發送郵件失敗: {e}")
-        # 在生產環境中，你可能想要記錄錯誤但不中斷流程
-        if settings.environment == "development":
-            print(f"重設連結: {reset_url}")
+    
+    queue_mail(db, email, '密碼重設請求', body)
+    db.commit()
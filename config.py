@@ -1,5 +1,10 @@
+import re
+from pydantic import AliasChoices, Field, field_validator
 from pydantic_settings import BaseSettings
 
+# 限流規則 "次數/單位"，與 ratelimit.parse_rule 的格式相同；空字串表示不限制
+RATE_LIMIT_RULE = re.compile(r"\s*[1-9]\d*\s*/\s*(second|minute|hour|day)s?\s*")
+
 class Settings(BaseSettings):
     # 告訴 Pydantic Settings 去讀取 .env 檔案
     # extra='ignore' 表示如果 .env 有額外變數但模型未定義，則忽略
@@ -14,6 +19,25 @@ class Settings(BaseSettings):
     
     # 資料庫設定
     database_url: str = "sqlite:///./todo.db"
+    # 啟用 async engine (需安裝 aiosqlite 或 asyncpg)，未指定 URL 時由 database_url 推導
+    async_database: bool = False
+    async_database_url: str = ""
+    # 選用的唯讀副本 (例如 PostgreSQL streaming replica)：GET /todos 等唯讀路由與驗證 token 時的用戶查詢改走副本，
+    # 用戶寫入後 read_your_writes_seconds 秒內的讀取仍走主資料庫，確保讀得到自己剛寫入的資料 (寫入時間記錄在用戶端的 cookie)
+    read_database_url: str = ""
+    read_your_writes_seconds: float = 5
+    # 連線池設定
+    db_pool_size: int = 5
+    db_max_overflow: int = 10
+    db_pool_timeout: int = 30  # 秒，等不到連線時的逾時
+    db_pool_pre_ping: bool = False
+    db_pool_recycle: int = -1  # 秒，-1 表示不回收
+    db_warmup_connections: int = 2  # 啟動後在背景預先建立的連線數，0 表示不預熱
+    # SQLite 調校 (WAL 讓讀寫可以同時進行)
+    sqlite_wal: bool = True
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout_ms: int = 5000
+    sqlite_mmap_size: int = 268435456  # 256 MB
     
     # 郵件設定
     smtp_server: str = "smtp.gmail.com"
@@ -21,6 +45,91 @@ class Settings(BaseSettings):
     smtp_username: str = ""
     smtp_password: str = ""
     smtp_from_email: str = ""
+    smtp_starttls: bool = True
+    smtp_timeout: int = 10  # 秒
+    # 背景寄信設定
+    mail_batch_size: int = 20  # 每次從佇列取出的郵件數
+    mail_max_attempts: int = 5  # 超過後不再重試
+    mail_dead_letter_retention_days: int = 7  # 不再重試的郵件保留天數 (供查看 last_error)，之後由 sweeper 刪除
+    mail_retry_base_seconds: int = 30  # 第 n 次失敗後等待 base * 2^(n-1) 秒
+    mail_retry_max_seconds: int = 3600
+    mail_poll_interval: int = 15  # 秒，沒有新郵件時多久檢查一次待重試的郵件
+    mail_idle_timeout: int = 60  # 秒，SMTP 連線閒置超過此時間就關閉
+    
+    # 過期資料清除設定 (密碼重設 token、todo tombstone 與不再重試的郵件共用)
+    # 舊的 RESET_TOKEN_SWEEP_INTERVAL / RESET_TOKEN_SWEEP_BATCH_SIZE 環境變數仍可使用
+    sweep_interval_seconds: int = Field(300, validation_alias=AliasChoices("sweep_interval_seconds", "reset_token_sweep_interval"))
+    sweep_batch_size: int = Field(500, validation_alias=AliasChoices("sweep_batch_size", "reset_token_sweep_batch_size"))
+    
+    # 限流設定 (格式 "次數/單位"，單位為 second/minute/hour/day，空字串表示不限制)
+    rate_limit_enabled: bool = True
+    # memory：每個 worker 各自計算，多 worker 時實際上限約為規則的 worker 數倍 (例如 WEB_CONCURRENCY=2 時為 2 倍)；
+    # redis：所有 worker / instance 共用狀態
+    rate_limit_backend: str = "memory"  # memory, redis
+    rate_limit_redis_url: str = "redis://localhost:6379/0"
+    rate_limit_trust_forwarded_for: bool = False  # 在反向代理後方時以 X-Forwarded-For 判斷來源 IP
+    rate_limit_trusted_proxy_count: int = 1  # 應用程式前方會附加 X-Forwarded-For 的代理層數 (Render 為 1)
+    rate_limit_login_ip: str = "20/minute"
+    rate_limit_login_user: str = "5/minute"
+    rate_limit_register_ip: str = "10/minute"
+    rate_limit_forgot_password_ip: str = "5/minute"
+    rate_limit_forgot_password_user: str = "3/hour"
+    rate_limit_reset_password_ip: str = "10/minute"
+
+    @field_validator(
+        "rate_limit_login_ip", "rate_limit_login_user", "rate_limit_register_ip",
+        "rate_limit_forgot_password_ip", "rate_limit_forgot_password_user", "rate_limit_reset_password_ip",
+    )
+    @classmethod
+    def check_rate_limit_rule(cls, rule: str) -> str:
+        """啟動時檢查限流規則的格式，避免在請求時才解析失敗"""
+        if rule and not RATE_LIMIT_RULE.fullmatch(rule):
+            raise ValueError(f'限流規則需為 "次數/單位" (單位為 second/minute/hour/day)：{rule!r}')
+        return rule
+    
+    # GET /metrics 指標收集 (請求延遲、SQL 數量與時間)
+    metrics_enabled: bool = True
+    # /metrics 系列路由需以 Authorization: Bearer <metrics_token> 存取；
+    # 未設定時只在開發環境開放，正式環境回傳 404
+    metrics_token: str = ""
+    
+    # 開發環境 (environment=development) 的 SQL profiler，同一種 SQL 在單一請求中重複達門檻次數即警告 N+1
+    sql_profiler_enabled: bool = True
+    sql_profiler_repeat_threshold: int = 3
+    
+    # readiness probe (GET /health/ready)：結果快取秒數、SELECT 1 逾時，以及判定為飽和的門檻
+    readiness_cache_seconds: float = 2
+    readiness_db_timeout: float = 1
+    readiness_max_pool_usage: float = 1.0  # 使用中連線數 / (pool_size + max_overflow)
+    readiness_max_query_p95_ms: float = 0  # 0 表示不檢查
+    
+    # 密碼雜湊設定 (bcrypt 在獨立的 executor 中執行，避免佔用 request threadpool)
+    hash_executor: str = "thread"  # thread, process
+    hash_workers: int = 2
+    hash_max_pending: int = 32  # 排隊中 + 執行中的雜湊工作上限，超過則回 503
+    
+    # 是否接受只有 email (sub) 的舊版 access token，過渡期結束後可關閉
+    accept_legacy_tokens: bool = True
+    
+    # 已驗證用戶的快取設定 (以 JWT 為 key，減少每個請求查詢 users 表)
+    # user_cache_ttl 也是撤銷 token 的時間上限：密碼重設只清除處理該請求的 worker 的快取，
+    # 其他 worker 上已快取的舊 token 最多 user_cache_ttl 秒後才會重新檢查 token_version
+    user_cache_ttl: float = 5  # 秒
+    user_cache_size: int = 10000
+    
+    # GET /todos 每頁筆數上限
+    todos_max_page_size: int = 1000
+    
+    # 已刪除 todo 的 tombstone 保留天數；since 早於此期限的同步請求需重新完整同步
+    todo_tombstone_retention_days: int = 30
+    
+    # 啟動時的 schema 處理 (migrations.py)：migrate 套用未執行的 migration，check 只檢查並警告，skip 不執行任何 DDL
+    # 使用 skip 時需在部署流程中另外執行 python migrations.py
+    schema_startup: str = "migrate"  # migrate, check, skip
+    
+    # gunicorn worker 數量 (gunicorn.conf.py)，0 表示與 CPU 核心數相同
+    # 每個 worker 各有自己的連線池與 bcrypt executor，總連線數為 web_concurrency * (db_pool_size + db_max_overflow)
+    web_concurrency: int = 0
     
     # 應用程式設定
     app_url: str = "http://localhost:5173"  # 前端 URL
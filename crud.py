@@ -0,0 +1,265 @@
+from fastapi import HTTPException
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import datetime
+from models import User, Todo
+from auth import consume_reset_token
+import search
+from schemas import TodoCreate, TodoUpdate
+
+# 資料庫存取函式
+# 皆為同步函式、第一個參數是 Session，由路由透過 `await db.run_sync(func, ...)` 呼叫，
+# 同一份程式碼可同時用於 threadpool 模式與 async engine (asyncpg / aiosqlite) 模式
+
+# 批次操作時每次 IN 查詢的 id 數量
+BULK_CHUNK_SIZE = 500
+
+TODO_COLUMNS = (Todo.id, Todo.title, Todo.description, Todo.status, Todo.owner_id)
+
+# 尚未刪除的 todo (已刪除的只保留 tombstone 供同步使用)
+ALIVE = Todo.deleted_at.is_(None)
+
+def get_user_by_email(db: Session, email: str):
+    """回傳登入所需的用戶欄位，找不到時回傳 None"""
+    return db.execute(
+        select(User.id, User.email, User.name, User.hashed_password, User.token_version)
+        .where(User.email == email)
+    ).first()
+
+def email_exists(db: Session, email: str) -> bool:
+    return db.scalar(select(User.id).where(User.email == email)) is not None
+
+def create_user(db: Session, email: str, name: str, hashed_password: str) -> dict:
+    user = User(email=email, name=name, hashed_password=hashed_password)
+    db.add(user)
+    db.flush()
+    created = {"id": user.id, "email": user.email, "name": user.name}
+    db.commit()
+    return created
+
+def reset_user_password(db: Session, token: str, hashed_password: str) -> str:
+    """使用重設 token 並更新用戶密碼 (同一個交易、一次 commit)，回傳用戶 email"""
+    email = consume_reset_token(token, db)
+    result = db.execute(
+        update(User)
+        .where(User.email == email)
+        .values(
+            hashed_password=hashed_password,
+            # 讓重設前簽發的 access token 全部失效
+            token_version=User.token_version + 1
+        )
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 0:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="User not found")
+    db.commit()
+    return email
+
+def get_todos_version(db: Session, owner_id: int) -> int:
+    return db.scalar(select(User.todos_version).where(User.id == owner_id)) or 0
+
+def bump_todos_version(db: Session, owner_id: int) -> int:
+    """遞增並回傳用戶的 todo 版本號，異動的 todo 會標上這個版本號
+    必須在寫入 todo 之前呼叫：更新 users 那一列會鎖住它，同一用戶的寫入交易因此依序進行，
+    版本號的順序與 commit 順序一致，GET /todos/changes 不會漏掉較晚 commit 的異動
+    """
+    statement = update(User).where(User.id == owner_id).values(todos_version=User.todos_version + 1)
+    if db.get_bind().dialect.update_returning:
+        return db.execute(
+            statement.returning(User.todos_version), execution_options={"synchronize_session": False}
+        ).scalar_one()
+    db.execute(statement, execution_options={"synchronize_session": False})
+    return get_todos_version(db, owner_id)
+
+def create_todos(db: Session, owner_id: int, todos: List[TodoCreate]) -> List[dict]:
+    if not todos:
+        return []
+    version = bump_todos_version(db, owner_id)
+    now = datetime.utcnow()
+    rows = [
+        {"title": todo.title, "description": todo.description, "status": 0, "owner_id": owner_id,
+         "version": version, "updated_at": now}
+        for todo in todos
+    ]
+
+    if db.get_bind().dialect.insert_executemany_returning:
+        # 以多列 INSERT ... RETURNING 批次取回新 id，不需要逐筆 refresh
+        # (不使用 sort_by_parameter_order，它在 SQLite 上會退化成逐筆 INSERT；
+        # 同一個 INSERT 內 id 依 VALUES 順序遞增，以 id 排序即為送出順序)
+        result = db.execute(insert(Todo).returning(*TODO_COLUMNS), rows)
+        new_todos = sorted((row._asdict() for row in result), key=lambda row: row["id"])
+    else:
+        # 不支援 RETURNING 的舊版 SQLite：交給 ORM flush 取得 id
+        # (commit 前先取出 id，避免 commit 後 expire 造成逐筆重新查詢)
+        db_todos = [Todo(**row) for row in rows]
+        db.add_all(db_todos)
+        db.flush()
+        new_todos = [
+            {"id": db_todo.id, **{column.key: row[column.key] for column in TODO_COLUMNS[1:]}}
+            for row, db_todo in zip(rows, db_todos)
+        ]
+    search.index_todos(db, new_todos, replace=False)
+    db.commit()
+    return new_todos
+
+def list_todos(
+    db: Session,
+    owner_id: int,
+    after_id: Optional[int] = None,
+    limit: Optional[int] = None,
+    status: Optional[int] = None,
+    title_prefix: Optional[str] = None,
+    order: str = "asc",
+) -> List[dict]:
+    """依條件查詢 todo，回傳欄位 tuple (順序同 TODO_COLUMNS)
+    指定 limit 時多取一筆，讓呼叫端判斷是否還有下一頁
+    """
+    query = select(*TODO_COLUMNS).where(Todo.owner_id == owner_id, ALIVE)
+    if status is not None:
+        query = query.where(Todo.status == status)
+    if title_prefix is not None:
+        escaped = title_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.where(Todo.title.like(f"{escaped}%", escape="\\"))
+
+    # keyset 分頁：以 id 為界，每一頁的成本與前面有幾頁無關
+    if after_id is not None:
+        query = query.where(Todo.id > after_id if order == "asc" else Todo.id < after_id)
+    query = query.order_by(Todo.id.asc() if order == "asc" else Todo.id.desc())
+    if limit is not None:
+        query = query.limit(limit + 1)
+    return db.execute(query).all()
+
+def update_todos(db: Session, owner_id: int, updates: List[TodoUpdate]) -> List[dict]:
+    # 同一個 id 出現多次時，以最後一筆為準
+    changes = {todo.id: todo for todo in updates}
+    ids = list(changes)
+    if not ids:
+        return []
+
+    # 先遞增版本號鎖住用戶那一列，再查詢目標 todo：
+    # 同時進行的刪除會等這個交易結束，查到的 todo 不會在 UPDATE 前被標記刪除，tombstone 不會被改寫或重新索引
+    version = bump_todos_version(db, owner_id)
+
+    # 一次查出所有目標 todo (分批避免超過 SQLite 參數數量上限)
+    rows = {}
+    for start in range(0, len(ids), BULK_CHUNK_SIZE):
+        chunk = ids[start:start + BULK_CHUNK_SIZE]
+        for row in db.execute(select(*TODO_COLUMNS).where(Todo.owner_id == owner_id, ALIVE, Todo.id.in_(chunk))):
+            rows[row.id] = row._asdict()
+
+    missing = [todo_id for todo_id in ids if todo_id not in rows]
+    if missing:
+        # 不存在或已被刪除：撤銷版本號的遞增
+        db.rollback()
+        raise HTTPException(status_code=404, detail=f"Todos with ids {missing} not found")
+
+    for todo_id, todo in changes.items():
+        row = rows[todo_id]
+        row["title"] = todo.title
+        if todo.description is not None:
+            row["description"] = todo.description
+        if todo.status is not None:
+            row["status"] = todo.status
+
+    # 以主鍵批次更新 (executemany)，不需要逐筆 SELECT / refresh
+    now = datetime.utcnow()
+    db.execute(update(Todo), [
+        {"id": row["id"], "title": row["title"], "description": row["description"], "status": row["status"],
+         "version": version, "updated_at": now}
+        for row in rows.values()
+    ])
+    search.index_todos(db, list(rows.values()))
+    db.commit()
+    return [rows[todo_id] for todo_id in ids]
+
+def batch_conditions(owner_id: int, ids: Optional[List[int]], status: Optional[int]) -> list:
+    """依 id 清單 (分批) 或狀態篩選，產生每一批的 WHERE 條件"""
+    if ids is None and status is None:
+        raise HTTPException(status_code=400, detail="Either ids or status filter is required")
+    conditions = [Todo.owner_id == owner_id, ALIVE]
+    if status is not None:
+        conditions.append(Todo.status == status)
+    if ids is None:
+        return [conditions]
+    unique_ids = list(dict.fromkeys(ids))
+    return [
+        conditions + [Todo.id.in_(unique_ids[start:start + BULK_CHUNK_SIZE])]
+        for start in range(0, len(unique_ids), BULK_CHUNK_SIZE)
+    ]
+
+def execute_returning_ids(db: Session, statement, conditions: list, supports_returning: bool) -> List[int]:
+    """執行批次 UPDATE / DELETE 並回傳受影響的 id"""
+    if supports_returning:
+        return list(db.scalars(
+            statement.where(*conditions).returning(Todo.id),
+            execution_options={"synchronize_session": False}
+        ))
+    # 不支援 RETURNING 的資料庫：先查出 id 再執行
+    affected_ids = list(db.scalars(select(Todo.id).where(*conditions)))
+    if affected_ids:
+        db.execute(statement.where(*conditions), execution_options={"synchronize_session": False})
+    return affected_ids
+
+def update_todos_batch(db: Session, owner_id: int, values: dict, ids: Optional[List[int]], status: Optional[int]) -> List[int]:
+    """批次更新符合條件的 todo 並標上新版本號，沒有任何 todo 符合時不遞增版本號"""
+    conditions_list = batch_conditions(owner_id, ids, status)
+    version = bump_todos_version(db, owner_id)
+    statement = update(Todo).values(version=version, updated_at=datetime.utcnow(), **values)
+    supports_returning = db.get_bind().dialect.update_returning
+    affected_ids = []
+    for conditions in conditions_list:
+        affected_ids += execute_returning_ids(db, statement, conditions, supports_returning)
+    if affected_ids:
+        if "deleted_at" in values:
+            search.unindex_todos(db, affected_ids)
+        db.commit()
+    else:
+        db.rollback()
+    return sorted(affected_ids)
+
+def delete_todos(db: Session, owner_id: int, ids: Optional[List[int]], status: Optional[int]) -> List[int]:
+    # 軟刪除：保留 tombstone，由 TodoTombstoneSweeper 在保留期限後清除
+    return update_todos_batch(db, owner_id, {"deleted_at": datetime.utcnow()}, ids, status)
+
+def update_todos_status(
+    db: Session, owner_id: int, new_status: int, ids: Optional[List[int]], status: Optional[int]
+) -> List[int]:
+    return update_todos_batch(db, owner_id, {"status": new_status}, ids, status)
+
+def update_single_todo(db: Session, owner_id: int, todo_id: int, values: dict) -> dict:
+    """更新單一 todo 並回傳更新前讀到的欄位 (套用 values 後)"""
+    version = bump_todos_version(db, owner_id)
+    row = db.execute(
+        select(*TODO_COLUMNS).where(Todo.id == todo_id, Todo.owner_id == owner_id, ALIVE)
+    ).first()
+    if row is None:
+        db.rollback()
+        raise HTTPException(status_code=404, detail="Todo not found")
+    db.execute(
+        update(Todo).where(Todo.id == todo_id).values(version=version, updated_at=datetime.utcnow(), **values),
+        execution_options={"synchronize_session": False}
+    )
+    if "deleted_at" in values:
+        search.unindex_todos(db, [todo_id])
+    db.commit()
+    return row._asdict() | {key: value for key, value in values.items() if key in row._fields}
+
+def delete_todo(db: Session, owner_id: int, todo_id: int) -> dict:
+    return update_single_todo(db, owner_id, todo_id, {"deleted_at": datetime.utcnow()})
+
+def update_todo_status(db: Session, owner_id: int, todo_id: int, new_status: int) -> dict:
+    return update_single_todo(db, owner_id, todo_id, {"status": new_status})
+
+def list_todo_changes(db: Session, owner_id: int, since_version: int, since_id: int, limit: int, include_deleted: bool):
+    """依 (version, id) 順序取出 since 之後異動的 todo，多取一筆判斷是否還有下一頁
+    回傳欄位 tuple (TODO_COLUMNS + version, deleted_at)
+    """
+    query = select(*TODO_COLUMNS, Todo.version, Todo.deleted_at).where(
+        Todo.owner_id == owner_id,
+        or_(Todo.version > since_version, and_(Todo.version == since_version, Todo.id > since_id)),
+    )
+    if not include_deleted:
+        query = query.where(ALIVE)
+    return db.execute(query.order_by(Todo.version, Todo.id).limit(limit + 1)).all()
@@ -0,0 +1,27 @@
+import os
+from config import settings
+
+# 正式環境啟動設定：gunicorn 管理多個 uvicorn worker process
+#   gunicorn main:app -c gunicorn.conf.py
+# preload_app 讓 master 先匯入 main 一次再 fork 出 worker，共用已載入的模組；
+# migration 在各 worker 的 lifespan 中由 schema_lock 依序執行，只有第一個 worker 實際套用
+# worker 繼承的連線池由 models.dispose_pools_after_fork 丟棄，每個 worker 重新建立自己的連線
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+workers = settings.web_concurrency or os.cpu_count() or 1
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+
+if workers > 1 and settings.rate_limit_enabled and settings.rate_limit_backend == "memory":
+    print(f"[gunicorn] 警告：限流狀態存在各 worker 的記憶體中，{workers} 個 worker 的實際上限約為規則的 {workers} 倍；"
+          "請設定 RATE_LIMIT_BACKEND=redis 共用狀態")
+
+# bcrypt 請求在忙碌時可能要排隊，逾時設定寬鬆一些；關閉時等待背景寄信 / 清除 thread 結束
+timeout = 60
+graceful_timeout = 30
+keepalive = 5
+
+# uvicorn 只有在連線來自這些位址時才以 X-Forwarded-For 改寫 request.client；
+# 不要設成 "*"：uvicorn 會把整串都當成可信任的代理而取最左邊 (用戶端可偽造) 的位址
+# 限流的來源 IP 由 ratelimit.client_ip 依 RATE_LIMIT_TRUSTED_PROXY_COUNT 自行判斷
+forwarded_allow_ips = os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1,::1")
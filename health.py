@@ -0,0 +1,92 @@
+import asyncio
+import time
+from sqlalchemy import text
+from starlette.concurrency import run_in_threadpool
+from config import settings
+from models import engine, async_engine, read_engine, async_read_engine, has_read_replica, pool_stats
+from metrics import recent_query_percentile
+
+# Readiness probe：檢查資料庫是否可用、連線池是否飽和
+# 結果快取 readiness_cache_seconds 秒，同一時間只有一個檢查在執行，負載平衡器頻繁探測也幾乎不花成本
+
+def _select_one(target):
+    with target.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+async def _async_select_one(target):
+    async with target.connect() as connection:
+        await connection.execute(text("SELECT 1"))
+
+async def _check_database(read_only: bool = False) -> dict:
+    """執行 SELECT 1，回傳檢查結果 (逾時或錯誤時 status 不為 ok)"""
+    start = time.perf_counter()
+    try:
+        if async_engine is not None:
+            target = async_read_engine if read_only else async_engine
+            await asyncio.wait_for(_async_select_one(target), settings.readiness_db_timeout)
+        else:
+            target = read_engine if read_only else engine
+            await asyncio.wait_for(run_in_threadpool(_select_one, target), settings.readiness_db_timeout)
+        return {"status": "ok", "latency_ms": round((time.perf_counter() - start) * 1000, 3)}
+    except asyncio.TimeoutError:
+        return {"status": "timeout"}
+    except Exception as e:
+        return {"status": "error", "error": type(e).__name__}
+
+class ReadinessProbe:
+    def __init__(self):
+        self._result: tuple[bool, dict] | None = None
+        self._checked_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def check(self) -> tuple[bool, dict]:
+        """回傳 (是否可接收流量, 各項檢查結果)"""
+        if self._result is not None and time.monotonic() - self._checked_at < settings.readiness_cache_seconds:
+            return self._result
+        async with self._lock:
+            # 等待 lock 期間可能已有其他請求完成檢查
+            if self._result is None or time.monotonic() - self._checked_at >= settings.readiness_cache_seconds:
+                self._result = await self._run_checks()
+                self._checked_at = time.monotonic()
+        return self._result
+
+    async def _run_checks(self) -> tuple[bool, dict]:
+        checks = {}
+        ready = True
+
+        pool = pool_stats()
+        capacity = pool.get("size", 0) + pool.get("max_overflow", 0)
+        usage = pool["checked_out"] / capacity if capacity and "checked_out" in pool else None
+        saturated = usage is not None and usage >= settings.readiness_max_pool_usage
+        checks["pool"] = {
+            "status": "saturated" if saturated else "ok",
+            "checked_out": pool.get("checked_out"),
+            "capacity": capacity or None,
+            "usage": round(usage, 3) if usage is not None else None,
+            "timeouts": pool["timeouts"],
+        }
+        ready &= not saturated
+
+        # 連線池已滿時不再取連線，避免 probe 自己排隊等到 db_pool_timeout
+        if saturated:
+            checks["database"] = {"status": "skipped"}
+        else:
+            checks["database"] = await _check_database()
+            ready &= checks["database"]["status"] == "ok"
+        # 唯讀副本無法使用時唯讀路由會失敗，同樣視為未就緒
+        if has_read_replica:
+            checks["read_replica"] = await _check_database(read_only=True)
+            ready &= checks["read_replica"]["status"] == "ok"
+
+        p95 = recent_query_percentile(95)
+        p95_ms = round(p95 * 1000, 3) if p95 is not None else None
+        slow = bool(settings.readiness_max_query_p95_ms) and p95_ms is not None and p95_ms > settings.readiness_max_query_p95_ms
+        checks["query_latency"] = {"status": "slow" if slow else "ok", "p95_ms": p95_ms}
+        ready &= not slow
+
+        # 只回報設定狀態，不實際連線 SMTP (寄信由背景佇列處理，失敗不影響接收請求)
+        checks["smtp"] = {"configured": bool(settings.smtp_username and settings.smtp_password)}
+
+        return ready, {"status": "ready" if ready else "unavailable", "checks": checks}
+
+readiness_probe = ReadinessProbe()
@@ -0,0 +1,212 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+from config import settings
+from models import SessionLocal, OutboundMail
+from metrics import mail_dead_letters_total, smtp_send_duration
+
+# 背景寄信
+# 郵件先寫入 outbound_mails 資料表 (重啟也不會遺失)，再由 MailDispatcher 在背景 thread 寄出：
+# - 重複使用同一條 SMTP 連線，斷線時自動重連，閒置過久才關閉
+# - 每次取出一批到期的郵件寄送，失敗時以指數退避重試
+# - 失敗 mail_max_attempts 次後不再重試 (dead letter)，計入 mail_dead_letters_total，之後由 sweeper.DeadMailSweeper 刪除
+# - 內文在寄出 (刪除整列) 或放棄重試 (清空 body) 後即不再保存；只有等待寄送的郵件會保留內文
+# smtplib / email 在第一次寄信時才匯入，不拖慢應用程式啟動
+
+def queue_mail(db: Session, to_email: str, subject: str, body: str):
+    """將郵件加入寄送佇列 (由呼叫端 commit)"""
+    db.add(OutboundMail(to_email=to_email, subject=subject, body=body))
+
+class SMTPSession:
+    """可重複使用的 SMTP 連線"""
+
+    def __init__(self):
+        self._server: "smtplib.SMTP | None" = None
+
+    def _connect(self) -> "smtplib.SMTP":
+        import smtplib
+
+        server = smtplib.SMTP(settings.smtp_server, settings.smtp_port, timeout=settings.smtp_timeout)
+        if settings.smtp_starttls:
+            server.starttls()
+        server.login(settings.smtp_username, settings.smtp_password)
+        return server
+
+    def send(self, to_email: str, subject: str, body: str):
+        import smtplib
+        from email.mime.multipart import MIMEMultipart
+        from email.mime.text import MIMEText
+
+        from_email = settings.smtp_from_email or settings.smtp_username
+        msg = MIMEMultipart()
+        msg['From'] = from_email
+        msg['To'] = to_email
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'plain'))
+
+        start = time.perf_counter()
+        outcome = "error"
+        try:
+            if self._server is None:
+                self._server = self._connect()
+            try:
+                self._server.sendmail(from_email, to_email, msg.as_string())
+            except smtplib.SMTPServerDisconnected:
+                # 連線已被伺服器關閉，重連後再試一次
+                self._server = self._connect()
+                self._server.sendmail(from_email, to_email, msg.as_string())
+            outcome = "ok"
+        finally:
+            smtp_send_duration.observe(time.perf_counter() - start, outcome)
+
+    def close(self):
+        if self._server is not None:
+            import smtplib
+
+            try:
+                self._server.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._server = None
+
+class ConsoleSession:
+    """未設定 SMTP 帳號時 (開發環境)：將郵件輸出到控制台"""
+
+    def send(self, to_email: str, subject: str, body: str):
+        print(f"郵件已發送到 {to_email}: {subject}")
+        print(body)
+
+    def close(self):
+        pass
+
+def retry_delay(attempts: int) -> timedelta:
+    """第 attempts 次失敗後的等待時間"""
+    seconds = settings.mail_retry_base_seconds * 2 ** (attempts - 1)
+    return timedelta(seconds=min(seconds, settings.mail_retry_max_seconds))
+
+class MailDispatcher:
+    """在背景 thread 寄出 outbound_mails 中到期的郵件"""
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._transport = None
+        self._last_sent = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="mail-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stopping.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def wake(self):
+        """有新郵件加入佇列時呼叫，立即開始寄送"""
+        self._wakeup.set()
+
+    def _get_transport(self):
+        if self._transport is None:
+            if settings.smtp_username and settings.smtp_password:
+                self._transport = SMTPSession()
+            else:
+                self._transport = ConsoleSession()
+        return self._transport
+
+    def _close_transport(self):
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                sent_any = self.dispatch_batch() > 0
+            except Exception as e:
+                print(f"寄送郵件佇列失敗: {e}")
+                sent_any = False
+            if sent_any:
+                # 可能還有下一批，繼續處理
+                continue
+            # 沒有郵件可寄：閒置過久就關閉 SMTP 連線，並等待新郵件或定期檢查待重試的郵件
+            if time.monotonic() - self._last_sent > settings.mail_idle_timeout:
+                self._close_transport()
+            self._wakeup.wait(settings.mail_poll_interval)
+            self._wakeup.clear()
+        self._close_transport()
+
+    def _claim_batch(self, db: Session) -> list:
+        """以一個 UPDATE 取出到期的郵件並延後其下次嘗試時間 (lease)，避免多個 worker 重複寄送
+        PostgreSQL 上選取時加上 FOR UPDATE SKIP LOCKED，其他 worker 直接跳過正在被取出的郵件
+        """
+        now = datetime.utcnow()
+        lease_until = now + timedelta(seconds=max(settings.smtp_timeout * 3, 60))
+        due = (OutboundMail.next_attempt_at <= now, OutboundMail.attempts < settings.mail_max_attempts)
+        candidates = (
+            select(OutboundMail.id)
+            .where(*due)
+            .order_by(OutboundMail.next_attempt_at)
+            .limit(settings.mail_batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        # 再次檢查到期條件：其他 worker 在這之前已取走的郵件 next_attempt_at 已被延後，不會重複取出
+        statement = (
+            update(OutboundMail)
+            .where(OutboundMail.id.in_(candidates.scalar_subquery()), *due)
+            .values(next_attempt_at=lease_until)
+        )
+        columns = (OutboundMail.id, OutboundMail.to_email, OutboundMail.subject, OutboundMail.body, OutboundMail.attempts)
+        if db.get_bind().dialect.update_returning:
+            mails = db.execute(statement.returning(*columns), execution_options={"synchronize_session": False}).all()
+        else:
+            # 不支援 RETURNING 的資料庫：以這次的 lease 時間找回取出的郵件
+            db.execute(statement, execution_options={"synchronize_session": False})
+            mails = db.execute(select(*columns).where(OutboundMail.next_attempt_at == lease_until)).all()
+        db.commit()
+        return sorted(mails, key=lambda mail: mail.id)
+
+    def dispatch_batch(self) -> int:
+        """寄出一批到期的郵件，回傳處理的數量"""
+        db = self.session_factory()
+        try:
+            mails = self._claim_batch(db)
+            if not mails:
+                return 0
+            sent_ids = []
+            for mail in mails:
+                try:
+                    self._get_transport().send(mail.to_email, mail.subject, mail.body)
+                    self._last_sent = time.monotonic()
+                    sent_ids.append(mail.id)
+                except Exception as e:
+                    print(f"發送郵件失敗 ({mail.to_email}): {e}")
+                    self._close_transport()
+                    attempts = mail.attempts + 1
+                    values = {"attempts": attempts, "next_attempt_at": datetime.utcnow(), "last_error": str(e)[:500]}
+                    if attempts >= settings.mail_max_attempts:
+                        # 不再重試 (dead letter)：清空內文 (可能含有密碼重設連結)，
+                        # 只保留收件者與錯誤原因 mail_dead_letter_retention_days 天，之後由 sweeper 刪除
+                        values["body"] = ""
+                        mail_dead_letters_total.inc()
+                        print(f"郵件 {mail.id} ({mail.to_email}) 已失敗 {attempts} 次，不再重試")
+                    else:
+                        values["next_attempt_at"] += retry_delay(attempts)
+                    db.execute(update(OutboundMail).where(OutboundMail.id == mail.id).values(**values))
+            if sent_ids:
+                db.execute(delete(OutboundMail).where(OutboundMail.id.in_(sent_ids)))
+            db.commit()
+            return len(mails)
+        finally:
+            db.close()
+
+mail_dispatcher = MailDispatcher()
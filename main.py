@@ -1,17 +1,73 @@
-from fastapi import FastAPI, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from fastapi import FastAPI, Depends, HTTPException, Query, Response, status
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from auth import get_password_hash, verify_password, create_access_token, get_current_user, ACCESS_TOKEN_EXPIRE_MINUTES, create_password_reset_token, verify_reset_token, mark_token_as_used, send_reset_email
-from models import Base, engine, get_db, User, Todo
-from schemas import UserCreate, UserLogin, UserOut, TodoCreate, TodoOut, TodoUpdate, APIResponse, TodoCreateList, TodoStatusUpdate, TodoUpdateList, ForgotPasswordRequest, ResetPasswordRequest
-from datetime import timedelta
-from fastapi.responses import JSONResponse
+from auth import get_password_hash_async, verify_password_async, shutdown_hash_executor, warm_up as warm_up_auth, create_user_access_token, get_current_user, get_read_db, get_write_db, CurrentUser, invalidate_cached_user, ACCESS_TOKEN_EXPIRE_MINUTES, create_password_reset_token, queue_reset_email
+from models import async_engine, async_read_engine, read_engine, has_read_replica, get_async_db, pool_stats, warm_up_pool, warm_up_async_pool
+from schemas import UserCreate, UserLogin, UserOut, LoginData, TodoCreate, TodoOut, TodoUpdate, APIResponse, TodoListResponse, TodoSearchResponse, TodoCreateList, TodoStatusUpdate, TodoUpdateList, TodoBatchResult, TodoChanges, ForgotPasswordRequest, ResetPasswordRequest
+from config import settings
+from datetime import datetime, timedelta
+from typing import List, Literal, Optional
+import asyncio
+import base64
+import hashlib
+import crud
+import migrations
+import search
+from mailer import mail_dispatcher
+from sweeper import dead_mail_sweeper, reset_token_sweeper, todo_tombstone_sweeper
+from ratelimit import RateLimitByIP, limit_by_user
+from serializers import ORJSONResponse, todo_rows
+from metrics import MetricsMiddleware, render_metrics, require_metrics_access
+from health import readiness_probe
+from profiler import SQLProfilerMiddleware, profiler_enabled, recent_profiles
+from fastapi.responses import JSONResponse, PlainTextResponse
 from fastapi import Request
 from fastapi.middleware.cors import CORSMiddleware
+from contextlib import asynccontextmanager
+from starlette.concurrency import run_in_threadpool
 
-Base.metadata.create_all(bind=engine)
+async def warm_up():
+    """啟動後在背景預熱：建立資料庫連線、載入 JWT 與 bcrypt，並檢查 schema 是否缺少索引
+    不阻擋啟動，第一個請求到達時通常已完成
+    """
+    try:
+        if settings.db_warmup_connections > 0:
+            if async_engine is not None:
+                await warm_up_async_pool(settings.db_warmup_connections)
+                if has_read_replica:
+                    await warm_up_async_pool(settings.db_warmup_connections, async_read_engine)
+            else:
+                await run_in_threadpool(warm_up_pool, settings.db_warmup_connections)
+                if has_read_replica:
+                    await run_in_threadpool(warm_up_pool, settings.db_warmup_connections, read_engine)
+        await run_in_threadpool(warm_up_auth)
+        if settings.schema_startup != "skip":
+            await run_in_threadpool(migrations.check_schema)
+    except Exception as e:
+        print(f"啟動預熱失敗: {e}")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # 匯入 main 時不碰資料庫；migration 在每個 worker 啟動時執行 (settings.schema_startup)，
+    # 多個 worker 由 schema_lock 依序進行，已是最新版本時只查詢一次版本號
+    await run_in_threadpool(migrations.run_on_startup)
+    warm_up_task = asyncio.create_task(warm_up())
+    mail_dispatcher.start()
+    reset_token_sweeper.start()
+    todo_tombstone_sweeper.start()
+    dead_mail_sweeper.start()
+    yield
+    warm_up_task.cancel()
+    dead_mail_sweeper.stop()
+    todo_tombstone_sweeper.stop()
+    reset_token_sweeper.stop()
+    mail_dispatcher.stop()
+    shutdown_hash_executor()
+    if async_engine is not None:
+        await async_engine.dispose()
+        if has_read_replica:
+            await async_read_engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
 
 # 設定 CORS
 app.add_middleware(
@@ -26,6 +82,14 @@ app.add_middleware(
     expose_headers=["*"]
 )
 
+# 記錄每個路由的延遲與 SQL 數量，供 GET /metrics 使用
+if settings.metrics_enabled:
+    app.add_middleware(MetricsMiddleware)
+
+# 開發環境：記錄每個請求的 SQL，偵測 N+1 並回傳 Server-Timing header
+if profiler_enabled:
+    app.add_middleware(SQLProfilerMiddleware)
+
 # 自訂 HTTPException handler，讓錯誤也有統一格式
 @app.exception_handler(HTTPException)
 async def custom_http_exception_handler(request: Request, exc: HTTPException):
@@ -35,32 +99,30 @@ async def custom_http_exception_handler(request: Request, exc: HTTPException):
             "code": exc.status_code,
             "message": exc.detail,
             "data": None
-        }
+        },
+        headers=getattr(exc, "headers", None)
     )
 
-@app.post("/register", response_model=APIResponse)
-def register(user: UserCreate, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if db_user:
+@app.post("/register", response_model=APIResponse[UserOut], dependencies=[Depends(RateLimitByIP("register", "rate_limit_register_ip"))])
+async def register(user: UserCreate, db = Depends(get_async_db)):
+    if await db.run_sync(crud.email_exists, user.email):
         raise HTTPException(status_code=400, detail="Email already registered")
-    hashed_password = get_password_hash(user.password)
-    new_user = User(email=user.email, name=user.name, hashed_password=hashed_password)
-    db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    hashed_password = await get_password_hash_async(user.password)
+    new_user = await db.run_sync(crud.create_user, user.email, user.name, hashed_password)
     return {
         "code": 200,
         "message": "註冊成功",
-        "data": UserOut.model_validate(new_user)
+        "data": new_user
     }
 
-@app.post("/login", response_model=APIResponse)
-def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.email).first()
-    if not db_user or not verify_password(user.password, db_user.hashed_password):
+@app.post("/login", response_model=APIResponse[LoginData], dependencies=[Depends(RateLimitByIP("login", "rate_limit_login_ip"))])
+async def login(user: UserLogin, db = Depends(get_async_db)):
+    limit_by_user("login", user.email, "rate_limit_login_user")
+    db_user = await db.run_sync(crud.get_user_by_email, user.email)
+    if not db_user or not await verify_password_async(user.password, db_user.hashed_password):
         raise HTTPException(status_code=400, detail="Incorrect email or password")
-    access_token = create_access_token(
-        data={"sub": db_user.email},
+    access_token = create_user_access_token(
+        db_user,
         expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     )
     return {
@@ -69,15 +131,17 @@ def login(user: UserLogin, db: Session = Depends(get_db)):
         "data": {"access_token": access_token, "name": db_user.name, "token_type": "bearer"}
     }
 
-@app.post("/forgot-password", response_model=APIResponse)
-def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db)):
+@app.post("/forgot-password", response_model=APIResponse, dependencies=[Depends(RateLimitByIP("forgot-password", "rate_limit_forgot_password_ip"))])
+async def forgot_password(request: ForgotPasswordRequest, db = Depends(get_async_db)):
+    limit_by_user("forgot-password", request.email, "rate_limit_forgot_password_user")
     try:
         # 建立重設 token
-        token = create_password_reset_token(request.email, db)
+        token = await db.run_sync(lambda session: create_password_reset_token(request.email, session))
         
-        # 如果 token 存在 (表示用戶存在)，才發送郵件
+        # 如果 token 存在 (表示用戶存在)，才將郵件加入寄送佇列，由背景寄出
         if token:
-            send_reset_email(request.email, token)
+            await db.run_sync(lambda session: queue_reset_email(request.email, token, session))
+            mail_dispatcher.wake()
         
         # 為了安全，無論用戶是否存在，都回傳成功的訊息
         return {
@@ -89,25 +153,15 @@ def forgot_password(request: ForgotPasswordRequest, db: Session = Depends(get_db
         # 這裡可以記錄錯誤，但不應將詳細資訊回傳給客戶端
         raise HTTPException(status_code=500, detail="An unexpected error occurred.")
 
-@app.post("/reset-password", response_model=APIResponse)
-def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db)):
+@app.post("/reset-password", response_model=APIResponse, dependencies=[Depends(RateLimitByIP("reset-password", "rate_limit_reset_password_ip"))])
+async def reset_password(request: ResetPasswordRequest, db = Depends(get_async_db)):
     try:
-        # 驗證 token
-        email = verify_reset_token(request.token, db)
-        
-        # 更新用戶密碼
-        user = db.query(User).filter(User.email == email).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
+        # 雜湊新密碼 (在開啟交易前完成，避免雜湊期間佔住資料庫鎖)
+        hashed_password = await get_password_hash_async(request.new_password)
         
-        # 雜湊新密碼
-        hashed_password = get_password_hash(request.new_password)
-        user.hashed_password = hashed_password
-        
-        # 標記 token 為已使用
-        mark_token_as_used(request.token, db)
-        
-        db.commit()
+        # 使用 token 並更新用戶密碼，一次 commit 完成
+        email = await db.run_sync(crud.reset_user_password, request.token, hashed_password)
+        invalidate_cached_user(email)
         
         return {
             "code": 200,
@@ -119,98 +173,250 @@ def reset_password(request: ResetPasswordRequest, db: Session = Depends(get_db))
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to reset password")
 
-@app.post("/todos", response_model=APIResponse)
-def create_todos(todos: TodoCreateList, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    new_todos = []
-    for todo in todos:
-        new_todo = Todo(title=todo.title, description=todo.description, owner_id=current_user.id)
-        db.add(new_todo)
-        new_todos.append(new_todo)
-    
-    db.commit()
-    for todo in new_todos:
-        db.refresh(todo)
-    
+@app.post("/todos", response_model=APIResponse[List[TodoOut]])
+async def create_todos(todos: TodoCreateList, db = Depends(get_write_db), current_user: CurrentUser = Depends(get_current_user)):
+    new_todos = await db.run_sync(crud.create_todos, current_user.id, todos)
     return {
         "code": 200,
         "message": "建立成功",
-        "data": [TodoOut.model_validate(todo) for todo in new_todos]
+        "data": new_todos
     }
 
-@app.get("/todos", response_model=APIResponse)
-def read_todos(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    todos = db.query(Todo).filter(Todo.owner_id == current_user.id).all()
+# id 與版本號的上限 (BIGINT / SQLite INTEGER)，超過時 SQLite driver 會丟出 OverflowError
+MAX_ID = 2**63 - 1
+
+def encode_cursor(todo_id: int) -> str:
+    """將最後一筆 todo 的 id 編碼成不透明的分頁 cursor"""
+    return base64.urlsafe_b64encode(f"id:{todo_id}".encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        prefix, todo_id = raw.split(":", 1)
+        todo_id = int(todo_id)
+        if prefix != "id" or not 0 <= todo_id <= MAX_ID:
+            raise ValueError(raw)
+        return todo_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def todos_etag(user_id: int, version: int, request: Request) -> str:
+    """以用戶、todo 版本號與查詢參數組成 strong ETag (不同分頁 / 篩選條件各自有不同的 ETag)"""
+    params = "&".join(f"{key}={value}" for key, value in sorted(request.query_params.multi_items()))
+    digest = hashlib.sha256(params.encode()).hexdigest()[:16]
+    return f'"{user_id}-{version}-{digest}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 使用弱比較：忽略 W/ 前綴，並支援多個值與 *"""
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.split(",")]
+    return "*" in candidates or etag in (value.removeprefix("W/") for value in candidates)
+
+@app.get("/todos", response_model=TodoListResponse, responses={304: {"description": "Todo 沒有異動 (If-None-Match 相符)"}})
+async def read_todos(
+    request: Request,
+    cursor: Optional[str] = Query(default=None, description="上一頁回傳的 next_cursor"),
+    after_id: Optional[int] = Query(default=None, ge=0, le=MAX_ID, description="只回傳 id 在此之後的 todo"),
+    limit: Optional[int] = Query(default=None, ge=1, le=settings.todos_max_page_size, description="每頁筆數，未指定則回傳全部"),
+    status: Optional[int] = Query(default=None, ge=0, le=1, description="任務狀態：0=未完成, 1=已完成"),
+    title_prefix: Optional[str] = Query(default=None, min_length=1, description="標題開頭"),
+    order: Literal["asc", "desc"] = Query(default="asc", description="依 id 排序方向"),
+    db = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    if cursor is not None:
+        after_id = decode_cursor(cursor)
+
+    # 先只讀版本號：與用戶手上的 ETag 相同時直接回 304，不載入任何 todo
+    # (版本號在讀取 todo 之前取得，期間若有異動，下一次輪詢會因版本號不同而重新下載)
+    version = await db.run_sync(crud.get_todos_version, current_user.id)
+    etag = todos_etag(current_user.id, version, request)
+    cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=cache_headers)
+
+    todos = await db.run_sync(crud.list_todos, current_user.id, after_id, limit, status, title_prefix, order)
+
+    next_cursor = None
+    if limit is not None and len(todos) > limit:
+        todos = todos[:limit]
+        next_cursor = encode_cursor(todos[-1].id)
+
+    # 直接序列化查詢結果，不再經過 response_model 逐筆驗證 (response_model 僅用於 API 文件)
+    return ORJSONResponse({
+        "code": 200,
+        "message": "查詢成功",
+        "data": todo_rows(todos),
+        "next_cursor": next_cursor
+    }, headers=cache_headers)
+
+@app.get("/todos/search", response_model=TodoSearchResponse)
+async def search_todos(
+    q: str = Query(min_length=1, max_length=200, description="關鍵字，以空白分隔的多個關鍵字需全部符合"),
+    limit: int = Query(default=20, ge=1, le=settings.todos_max_page_size, description="每頁筆數"),
+    offset: int = Query(default=0, ge=0, description="上一頁回傳的 next_offset"),
+    db = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    todos = await db.run_sync(search.search_todos, current_user.id, q, limit, offset)
+    next_offset = offset + limit if len(todos) > limit else None
+    return ORJSONResponse({
+        "code": 200,
+        "message": "查詢成功",
+        "data": todo_rows(todos[:limit]),
+        "next_offset": next_offset
+    })
+
+def encode_sync_token(version: int, todo_id: int, issued_at: datetime) -> str:
+    """同步進度：已看過的最後一筆異動 (version, id) 與發出時間"""
+    raw = f"v:{version}:{todo_id}:{int(issued_at.timestamp())}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_sync_token(token: str) -> tuple[int, int, datetime]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)).decode()
+        prefix, version, todo_id, issued_at = raw.split(":")
+        version, todo_id = int(version), int(todo_id)
+        if prefix != "v" or not (0 <= version <= MAX_ID and 0 <= todo_id <= MAX_ID):
+            raise ValueError(raw)
+        return version, todo_id, datetime.fromtimestamp(int(issued_at))
+    except (ValueError, OverflowError, OSError):
+        # fromtimestamp 遇到超出範圍的時間會丟出 OverflowError / OSError
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+@app.get("/todos/changes", response_model=APIResponse[TodoChanges])
+async def read_todo_changes(
+    since: Optional[str] = Query(default=None, description="上一次回傳的 next_since，未指定則回傳全部 todo"),
+    limit: int = Query(default=settings.todos_max_page_size, ge=1, le=settings.todos_max_page_size, description="最多回傳幾筆異動"),
+    db = Depends(get_read_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    now = datetime.now()
+    if since is None:
+        since_version, since_id = 0, 0
+    else:
+        since_version, since_id, issued_at = decode_sync_token(since)
+        # 超過保留期限的 tombstone 已被清除，無法得知期間刪除了哪些 todo
+        if now - issued_at > timedelta(days=settings.todo_tombstone_retention_days):
+            raise HTTPException(status_code=410, detail="Sync token expired, full resync required")
+
+    rows = await db.run_sync(
+        crud.list_todo_changes, current_user.id, since_version, since_id, limit, since is not None
+    )
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        since_version, since_id = rows[-1].version, rows[-1].id
+
     return {
         "code": 200,
         "message": "查詢成功",
-        "data": [TodoOut.model_validate(todo) for todo in todos]
+        "data": {
+            "upserts": [row for row in rows if row.deleted_at is None],
+            "deleted": [row.id for row in rows if row.deleted_at is not None],
+            "next_since": encode_sync_token(since_version, since_id, now),
+            "has_more": has_more,
+        }
     }
 
-@app.put("/todos", response_model=APIResponse)
-def update_todos(
+@app.put("/todos", response_model=APIResponse[List[TodoOut]])
+async def update_todos(
     updates: TodoUpdateList,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db = Depends(get_write_db),
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    updated_todos = []
-    for todo in updates:
-        db_todo = db.query(Todo).filter(Todo.id == todo.id, Todo.owner_id == current_user.id).first()
-        if not db_todo:
-            raise HTTPException(status_code=404, detail=f"Todo with id {todo.id} not found")
-        
-        db_todo.title = todo.title
-        if todo.description is not None:
-            db_todo.description = todo.description
-        if todo.status is not None:
-            db_todo.status = todo.status
-        
-        updated_todos.append(db_todo)
-    
-    db.commit()
-    for todo in updated_todos:
-        db.refresh(todo)
-    
+    updated_todos = await db.run_sync(crud.update_todos, current_user.id, updates)
     return {
         "code": 200,
         "message": "更新成功",
-        "data": [TodoOut.model_validate(todo) for todo in updated_todos]
+        "data": updated_todos
     }
 
-@app.delete("/todos/{todo_id}", response_model=APIResponse)
-def delete_todo(todo_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    db_todo = db.query(Todo).filter(Todo.id == todo_id, Todo.owner_id == current_user.id).first()
-    if not db_todo:
-        raise HTTPException(status_code=404, detail="Todo not found")
-    deleted_todo = TodoOut.model_validate(db_todo)
-    db.delete(db_todo)
-    db.commit()
+@app.delete("/todos", response_model=APIResponse[TodoBatchResult])
+async def delete_todos(
+    ids: Optional[List[int]] = Query(default=None, description="要刪除的 todo id"),
+    status: Optional[int] = Query(default=None, ge=0, le=1, description="只刪除此狀態的 todo"),
+    db = Depends(get_write_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    deleted_ids = await db.run_sync(crud.delete_todos, current_user.id, ids, status)
+    return {
+        "code": 200,
+        "message": "刪除成功",
+        "data": {"count": len(deleted_ids), "ids": deleted_ids}
+    }
+
+@app.patch("/todos/status", response_model=APIResponse[TodoBatchResult])
+async def update_todos_status(
+    status_update: TodoStatusUpdate,
+    ids: Optional[List[int]] = Query(default=None, description="要更新的 todo id"),
+    status: Optional[int] = Query(default=None, ge=0, le=1, description="只更新目前為此狀態的 todo"),
+    db = Depends(get_write_db),
+    current_user: CurrentUser = Depends(get_current_user)
+):
+    updated_ids = await db.run_sync(crud.update_todos_status, current_user.id, status_update.status, ids, status)
+    return {
+        "code": 200,
+        "message": "狀態更新成功",
+        "data": {"count": len(updated_ids), "ids": updated_ids}
+    }
+
+@app.delete("/todos/{todo_id}", response_model=APIResponse[TodoOut])
+async def delete_todo(todo_id: int, db = Depends(get_write_db), current_user: CurrentUser = Depends(get_current_user)):
+    deleted_todo = await db.run_sync(crud.delete_todo, current_user.id, todo_id)
     return {
         "code": 200,
         "message": "刪除成功",
         "data": deleted_todo
     }
 
-@app.patch("/todos/{todo_id}/status", response_model=APIResponse)
-def update_todo_status(
+@app.patch("/todos/{todo_id}/status", response_model=APIResponse[TodoOut])
+async def update_todo_status(
     todo_id: int, 
     status_update: TodoStatusUpdate, 
-    db: Session = Depends(get_db), 
-    current_user: User = Depends(get_current_user)
+    db = Depends(get_write_db), 
+    current_user: CurrentUser = Depends(get_current_user)
 ):
-    db_todo = db.query(Todo).filter(Todo.id == todo_id, Todo.owner_id == current_user.id).first()
-    if not db_todo:
-        raise HTTPException(status_code=404, detail="Todo not found")
-    
-    db_todo.status = status_update.status
-    db.commit()
-    db.refresh(db_todo)
-    
+    updated_todo = await db.run_sync(crud.update_todo_status, current_user.id, todo_id, status_update.status)
     return {
         "code": 200,
         "message": "狀態更新成功",
-        "data": TodoOut.model_validate(db_todo)
+        "data": updated_todo
     }
 
+# liveness：只確認 process 還能回應，不檢查任何相依服務
 @app.api_route("/health", methods=["GET", "HEAD"])
-def health_check():
+@app.api_route("/health/live", methods=["GET", "HEAD"])
+async def health_check():
     return {"status": "ok"}
+
+# readiness：資料庫無法使用或連線池飽和時回 503，讓負載平衡器暫停導流
+@app.api_route("/health/ready", methods=["GET", "HEAD"])
+async def readiness_check():
+    ready, result = await readiness_probe.check()
+    return JSONResponse(status_code=200 if ready else 503, content=result)
+
+@app.get("/metrics", response_class=PlainTextResponse, dependencies=[Depends(require_metrics_access)])
+async def metrics():
+    """Prometheus 文字格式的指標 (async 路由：讀取 threadpool 使用量必須在 event loop 中執行)"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+@app.get("/metrics/pool", dependencies=[Depends(require_metrics_access)])
+def pool_metrics():
+    """資料庫連線池使用狀況，用來調整 db_pool_size / db_max_overflow"""
+    return pool_stats()
+
+@app.get("/metrics/reset-tokens", dependencies=[Depends(require_metrics_access)])
+def reset_token_metrics():
+    """過期密碼重設 token 清除作業的統計"""
+    return reset_token_sweeper.metrics.snapshot()
+
+if profiler_enabled:
+    @app.get("/debug/sql-profiles")
+    async def sql_profiles(profile_id: Optional[int] = Query(default=None, description="回應 header 中的 X-SQL-Profile-Id")):
+        """最近 100 個請求的 SQL 紀錄 (僅開發環境)"""
+        profiles = [profile.to_dict() for profile in recent_profiles if profile_id is None or profile.id == profile_id]
+        if profile_id is not None and not profiles:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return profiles
@@ -0,0 +1,251 @@
+import secrets
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from anyio.to_thread import current_default_thread_limiter
+from fastapi import Header, HTTPException, status
+from sqlalchemy import event
+from config import settings
+from models import sync_engines, pool_stats
+from sweeper import dead_mail_sweeper, reset_token_sweeper, todo_tombstone_sweeper
+
+# Prometheus 文字格式的指標 (GET /metrics)
+# 不依賴 prometheus_client：指標都在同一個 process 內累計，多 worker 部署時請各別抓取
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {_format_value(total)}")
+        return lines
+
+class Gauge(Counter):
+    def dec(self, *label_values, amount: float = 1):
+        self.inc(*label_values, amount=-amount)
+
+    def render(self) -> list[str]:
+        lines = super().render()
+        lines[1] = f"# TYPE {self.name} gauge"
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # label 值 -> [各 bucket 的次數..., 總和, 總次數]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((values, list(series)) for values, series in self._series.items())
+        for values, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _format_labels(self.labels, values, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            inf_labels = _format_labels(self.labels, values, 'le="+Inf"')
+            lines.append(f"{self.name}_bucket{inf_labels} {series[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labels, values)} {_format_value(series[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labels, values)} {series[-1]}")
+        return lines
+
+http_requests_total = Counter(
+    "http_requests_total", "HTTP 請求數", ("method", "route", "status"))
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "HTTP 請求處理時間", ("method", "route"))
+http_requests_in_flight = Gauge(
+    "http_requests_in_flight", "處理中的 HTTP 請求數")
+http_request_db_queries = Histogram(
+    "http_request_db_queries", "每個請求送出的 SQL 數量", ("method", "route"), COUNT_BUCKETS)
+http_request_db_duration = Histogram(
+    "http_request_db_duration_seconds", "每個請求花在 SQL 的總時間", ("method", "route"))
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "單一 SQL 的執行時間", buckets=QUERY_BUCKETS)
+password_hash_duration = Histogram(
+    "password_hash_duration_seconds", "bcrypt 雜湊 / 驗證時間 (不含排隊)", ("operation",))
+password_hash_jobs_in_flight = Gauge(
+    "password_hash_jobs_in_flight", "排隊中與執行中的 bcrypt 工作數")
+smtp_send_duration = Histogram(
+    "smtp_send_duration_seconds", "SMTP 寄信時間 (含重新連線)", ("outcome",))
+mail_dead_letters_total = Counter(
+    "mail_dead_letters_total", "失敗 mail_max_attempts 次後不再重試的郵件數")
+
+# 目前請求的 SQL 統計 [次數, 總秒數]；
+# run_in_threadpool 與 AsyncSession 都會沿用呼叫端的 context，所以在 thread 中也能累加到同一個請求
+_request_queries: ContextVar[list | None] = ContextVar("request_queries", default=None)
+
+# 最近的 SQL 執行時間 (秒)，供 readiness probe 計算 p95
+_recent_query_durations: deque = deque(maxlen=1000)
+
+def recent_query_percentile(p: float) -> float | None:
+    """最近 1000 筆 SQL 執行時間的第 p 百分位數 (秒)，尚無資料時回傳 None"""
+    samples = sorted(_recent_query_durations)
+    if not samples:
+        return None
+    return samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+
+# 每一筆 SQL 的執行時間只在這裡量測一次，指標與開發環境的 SQL profiler 都以 add_query_observer 訂閱
+_query_observers: list = []
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start_time"].pop()
+    for observer in _query_observers:
+        observer(statement, elapsed)
+
+def instrument_engine(target):
+    event.listen(target, "before_cursor_execute", _before_cursor_execute)
+    event.listen(target, "after_cursor_execute", _after_cursor_execute)
+
+def add_query_observer(observer):
+    """訂閱每一筆 SQL 的 (statement, 秒數)；第一次訂閱時才在主資料庫與唯讀副本 (sync / async) 掛上計時 hook"""
+    if not _query_observers:
+        for target in sync_engines():
+            instrument_engine(target)
+    _query_observers.append(observer)
+
+def _record_query(statement: str, elapsed: float):
+    db_query_duration.observe(elapsed)
+    _recent_query_durations.append(elapsed)
+    queries = _request_queries.get()
+    if queries is not None:
+        queries[0] += 1
+        queries[1] += elapsed
+
+class MetricsMiddleware:
+    """記錄每個路由的延遲、狀態碼與 SQL 數量 (純 ASGI middleware，不經過 BaseHTTPMiddleware)"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        queries = [0, 0.0]
+        token = _request_queries.set(queries)
+        http_requests_in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            http_requests_in_flight.dec()
+            _request_queries.reset(token)
+            # 以路由樣板 (例如 /todos/{todo_id}) 作為 label，未匹配的路徑統一歸類，避免 label 數量失控
+            route = scope.get("route")
+            route_path = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            http_requests_total.inc(method, route_path, status_code)
+            http_request_duration.observe(elapsed, method, route_path)
+            http_request_db_queries.observe(queries[0], method, route_path)
+            http_request_db_duration.observe(queries[1], method, route_path)
+
+def _threadpool_lines() -> list[str]:
+    """request threadpool (anyio) 的使用量，必須在 event loop 中呼叫"""
+    limiter = current_default_thread_limiter()
+    statistics = limiter.statistics()
+    return [
+        "# HELP threadpool_threads_total threadpool 可用的 thread 數",
+        "# TYPE threadpool_threads_total gauge",
+        f"threadpool_threads_total {_format_value(limiter.total_tokens)}",
+        "# HELP threadpool_threads_busy threadpool 使用中的 thread 數",
+        "# TYPE threadpool_threads_busy gauge",
+        f"threadpool_threads_busy {_format_value(limiter.borrowed_tokens)}",
+        "# HELP threadpool_tasks_waiting 等待 thread 的工作數",
+        "# TYPE threadpool_tasks_waiting gauge",
+        f"threadpool_tasks_waiting {statistics.tasks_waiting}",
+    ]
+
+def _stats_lines(prefix: str, stats: dict, types: dict) -> list[str]:
+    """將既有的統計 dict (pool_stats / sweeper metrics) 轉成指標"""
+    lines = []
+    for key, metric_type in types.items():
+        value = stats.get(key)
+        if value is None:
+            continue
+        name = f"{prefix}_{key}"
+        lines += [f"# TYPE {name} {metric_type}", f"{name} {_format_value(value)}"]
+    return lines
+
+def require_metrics_access(authorization: str | None = Header(default=None)):
+    """/metrics 系列路由的存取控制 (內含連線池、路由延遲等內部資訊，不可公開)"""
+    if not settings.metrics_enabled or not (settings.metrics_token or settings.environment == "development"):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not Found")
+    if not settings.metrics_token:
+        return
+    scheme, _, token = (authorization or "").partition(" ")
+    if scheme.lower() != "bearer" or not secrets.compare_digest(token.encode(), settings.metrics_token.encode()):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid metrics token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+def render_metrics() -> str:
+    lines = []
+    for metric in (http_requests_total, http_request_duration, http_requests_in_flight, http_request_db_queries,
+                   http_request_db_duration, db_query_duration, password_hash_duration, password_hash_jobs_in_flight, smtp_send_duration,
+                   mail_dead_letters_total):
+        lines += metric.render()
+    lines += _threadpool_lines()
+    lines += _stats_lines("db_pool", pool_stats(), {
+        "checkouts": "counter", "timeouts": "counter", "wait_seconds_total": "counter",
+        "wait_seconds_max": "gauge", "size": "gauge", "checked_out": "gauge", "overflow": "gauge",
+    })
+    sweep_types = {"runs": "counter", "deleted_total": "counter", "errors": "counter", "last_duration_seconds": "gauge"}
+    lines += _stats_lines("reset_token_sweep", reset_token_sweeper.metrics.snapshot(), sweep_types)
+    lines += _stats_lines("todo_tombstone_sweep", todo_tombstone_sweeper.metrics.snapshot(), sweep_types)
+    lines += _stats_lines("dead_mail_sweep", dead_mail_sweeper.metrics.snapshot(), sweep_types)
+    return "\n".join(lines) + "\n"
+
+if settings.metrics_enabled:
+    add_query_observer(_record_query)
@@ -0,0 +1,162 @@
+import sys
+from datetime import datetime
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, inspect, select, text
+from sqlalchemy.schema import CreateIndex
+from config import settings
+from models import Base, engine, PasswordResetToken, schema_lock
+import search
+
+# 資料庫 schema 版本管理
+# 已套用的 migration 記錄在 schema_migrations，啟動時依 settings.schema_startup 決定：
+#   migrate：套用尚未執行的 migration (預設)
+#   check：不執行 DDL，只在啟動後檢查並警告
+#   skip：完全不碰 schema，需在部署時另外執行 python migrations.py
+# 新資料庫的資料表由 0001 依目前的 models 建立，之後的 migration 都需可重複執行 (先檢查再新增)
+
+schema_migrations = Table(
+    "schema_migrations",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("name", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+def add_column(conn, table: str, name: str, ddl: str):
+    if name not in {column["name"] for column in inspect(conn).get_columns(table)}:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {name} {ddl}"))
+
+def invalid_indexes(conn) -> set[str]:
+    """PostgreSQL 上 CREATE INDEX CONCURRENTLY 中途失敗會留下無效的索引"""
+    if conn.dialect.name != "postgresql":
+        return set()
+    return set(conn.execute(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid WHERE NOT i.indisvalid"
+    )).scalars())
+
+def create_indexes(conn, *names: str, concurrently: bool = False):
+    """建立 models 中宣告但尚未存在的索引
+    concurrently=True 時在 PostgreSQL 使用 CREATE INDEX CONCURRENTLY，建立期間不會鎖住寫入 (需在交易外執行)
+    """
+    indexes = {index.name: index for table in Base.metadata.sorted_tables for index in table.indexes}
+    concurrently = concurrently and conn.dialect.name == "postgresql"
+    invalid = invalid_indexes(conn)
+    for name in names:
+        index = indexes[name]
+        if name in invalid:
+            conn.execute(text(f"DROP INDEX {'CONCURRENTLY ' if concurrently else ''}IF EXISTS {name}"))
+        elif name in {i["name"] for i in inspect(conn).get_indexes(index.table.name)}:
+            continue
+        if concurrently:
+            ddl = str(CreateIndex(index).compile(dialect=conn.dialect))
+            conn.execute(text(ddl.replace(" INDEX ", " INDEX CONCURRENTLY ", 1)))
+        else:
+            index.create(bind=conn)
+
+# 由 0003 以 CONCURRENTLY 建立的索引 (舊資料庫上的 todos 與 password_reset_tokens 可能很大)
+CONCURRENT_INDEXES = (
+    "ix_todos_owner_id_id",
+    "ix_todos_owner_status_id",
+    "ix_todos_owner_version_id",
+    "ix_password_reset_tokens_expires_at",
+)
+
+def baseline(conn):
+    """建立資料表，並補上 migration 機制之前 (create_all 時期) 的舊資料庫缺少的欄位與單欄索引"""
+    Base.metadata.create_all(bind=conn)
+    add_column(conn, "users", "token_version", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "users", "todos_version", "INTEGER NOT NULL DEFAULT 0")
+    add_column(conn, "todos", "updated_at", "TIMESTAMP")
+    add_column(conn, "todos", "deleted_at", "TIMESTAMP")
+    add_column(conn, "todos", "version", "INTEGER NOT NULL DEFAULT 0")
+    if "token_hash" not in {column["name"] for column in inspect(conn).get_columns("password_reset_tokens")}:
+        # 舊版以明文儲存 token；重設 token 只有 1 小時效期，直接重建資料表
+        PasswordResetToken.__table__.drop(bind=conn)
+        PasswordResetToken.__table__.create(bind=conn)
+    create_indexes(conn, *(
+        index.name for table in Base.metadata.sorted_tables for index in table.indexes
+        if index.name not in CONCURRENT_INDEXES
+    ))
+
+def concurrent_indexes(conn):
+    create_indexes(conn, *CONCURRENT_INDEXES, concurrently=True)
+
+# (版本, 名稱, 函式, 是否在交易中執行)；CREATE INDEX CONCURRENTLY 不能在交易中執行
+MIGRATIONS = [
+    (1, "baseline", baseline, True),
+    (2, "search_index", search.create_search_index, True),
+    (3, "todo_indexes", concurrent_indexes, False),  # 名稱已記錄在既有資料庫的 schema_migrations
+]
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(conn) -> int:
+    if not inspect(conn).has_table("schema_migrations"):
+        return 0
+    return conn.execute(select(schema_migrations.c.version).order_by(schema_migrations.c.version.desc())).scalar() or 0
+
+def upgrade(bind=None) -> list[str]:
+    """套用尚未執行的 migration，回傳套用的名稱；多個 process 同時執行時由 schema_lock 依序進行"""
+    bind = bind or engine
+    with bind.connect() as conn:
+        if current_version(conn) >= LATEST_VERSION:
+            return []
+    applied = []
+    with schema_lock(bind):
+        with bind.begin() as conn:
+            schema_migrations.create(bind=conn, checkfirst=True)
+            version = current_version(conn)
+        for number, name, migrate, transactional in MIGRATIONS:
+            if number <= version:
+                continue
+            print(f"[migrations] 套用 {number:04d}_{name}")
+            if transactional:
+                with bind.begin() as conn:
+                    migrate(conn)
+                    conn.execute(schema_migrations.insert().values(version=number, name=name, applied_at=datetime.utcnow()))
+            else:
+                with bind.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+                    migrate(conn)
+                    conn.execute(schema_migrations.insert().values(version=number, name=name, applied_at=datetime.utcnow()))
+            applied.append(name)
+    return applied
+
+def check_schema(bind=None) -> list[str]:
+    """檢查 schema 版本與查詢需要的索引，回傳問題清單並印出警告"""
+    problems = []
+    with (bind or engine).connect() as conn:
+        version = current_version(conn)
+        if version < LATEST_VERSION:
+            problems.append(f"schema 版本 {version} 落後於 {LATEST_VERSION}")
+        inspector = inspect(conn)
+        tables = set(inspector.get_table_names())
+        invalid = invalid_indexes(conn)
+        for table in Base.metadata.sorted_tables:
+            if table.name not in tables:
+                problems.append(f"缺少資料表 {table.name}")
+                continue
+            existing = {index["name"] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    problems.append(f"缺少索引 {index.name} ({table.name})")
+                elif index.name in invalid:
+                    problems.append(f"索引 {index.name} ({table.name}) 無效，需要重建")
+        if "todos" in tables and not search.search_index_exists(conn):
+            problems.append("缺少搜尋索引")
+    for problem in problems:
+        print(f"[migrations] 警告：{problem}，請執行 python migrations.py")
+    return problems
+
+def run_on_startup():
+    """settings.schema_startup 為 migrate 時套用尚未執行的 migration
+    check_schema 不影響能否啟動，由 main.warm_up 在啟動後於背景執行
+    """
+    if settings.schema_startup == "migrate":
+        upgrade()
+
+if __name__ == "__main__":
+    # python migrations.py          套用 migration
+    # python migrations.py check    只檢查
+    if sys.argv[1:] == ["check"]:
+        sys.exit(1 if check_schema() else 0)
+    applied = upgrade()
+    print(f"已套用 {len(applied)} 個 migration，目前版本 {LATEST_VERSION}")
+    sys.exit(1 if check_schema() else 0)
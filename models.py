@@ -1,31 +1,231 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, create_engine, DateTime
+from sqlalchemy import Column, Integer, String, ForeignKey, create_engine, DateTime, Index, LargeBinary, event, text
+from sqlalchemy import exc as sqlalchemy_exc
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship, sessionmaker, Session
+from starlette.concurrency import run_in_threadpool
+from contextlib import AsyncExitStack, ExitStack, asynccontextmanager, contextmanager
 from datetime import datetime
 from config import settings
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
 
 # 使用環境變數中的資料庫 URL
 DATABASE_URL = settings.database_url
 
-# 根據資料庫類型設定不同的連接參數
-if DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(
-        DATABASE_URL, connect_args={"check_same_thread": False}
+class PoolMetrics:
+    """連線池的取用次數、等待時間與逾時次數"""
+
+    def __init__(self):
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._lock = threading.Lock()
+
+    def record_wait(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.timeouts += timed_out
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+    def snapshot(self, pool) -> dict:
+        with self._lock:
+            stats = {
+                "checkouts": self.checkouts,
+                "timeouts": self.timeouts,
+                "wait_seconds_total": round(self.wait_seconds_total, 6),
+                "wait_seconds_max": round(self.wait_seconds_max, 6),
+            }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "max_overflow": pool._max_overflow,
+            })
+        return stats
+
+pool_metrics = PoolMetrics()
+
+class TimedPoolMixin:
+    """記錄每次從連線池取得連線所花的等待時間"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except sqlalchemy_exc.TimeoutError:
+            pool_metrics.record_wait(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.record_wait(time.perf_counter() - start)
+        return connection
+
+class TimedQueuePool(TimedPoolMixin, QueuePool):
+    pass
+
+class TimedAsyncAdaptedQueuePool(TimedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+def engine_options(url: str, poolclass) -> dict:
+    """依資料庫類型與設定產生 create_engine 的參數"""
+    options = {}
+    if is_sqlite(url):
+        options["connect_args"] = {"check_same_thread": False} if "aiosqlite" not in url else {}
+        if ":memory:" in url or url.rstrip("/").endswith("sqlite:"):
+            # 記憶體資料庫使用 SQLAlchemy 預設的單一連線池
+            return options
+    options.update(
+        poolclass=poolclass,
+        pool_size=settings.db_pool_size,
+        max_overflow=settings.db_max_overflow,
+        pool_timeout=settings.db_pool_timeout,
+        pool_pre_ping=settings.db_pool_pre_ping,
+        pool_recycle=settings.db_pool_recycle,
     )
-else:
-    # PostgreSQL 或其他資料庫
-    engine = create_engine(DATABASE_URL)
+    return options
+
+def apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """每條新的 SQLite 連線建立時套用調校參數"""
+    cursor = dbapi_connection.cursor()
+    if settings.sqlite_wal:
+        cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute(f"PRAGMA synchronous={settings.sqlite_synchronous}")
+    cursor.execute(f"PRAGMA busy_timeout={int(settings.sqlite_busy_timeout_ms)}")
+    cursor.execute(f"PRAGMA mmap_size={int(settings.sqlite_mmap_size)}")
+    cursor.close()
+
+def make_engine(url: str):
+    new_engine = create_engine(url, **engine_options(url, TimedQueuePool))
+    if is_sqlite(url):
+        event.listen(new_engine, "connect", apply_sqlite_pragmas)
+    return new_engine
+
+engine = make_engine(DATABASE_URL)
+# 選用的唯讀副本：唯讀路由改由 read_engine 查詢，未設定時與 engine 相同
+read_engine = make_engine(settings.read_database_url) if settings.read_database_url else engine
+has_read_replica = read_engine is not engine
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 Base = declarative_base()
 
-# 取得 DB session 的依賴
-def get_db():
-    db = SessionLocal()
-    try:
+def to_async_url(url: str) -> str:
+    """將同步的資料庫 URL 轉成對應的 async driver (aiosqlite / asyncpg)"""
+    scheme, rest = url.split("://", 1)
+    if scheme.startswith("sqlite"):
+        return f"sqlite+aiosqlite://{rest}"
+    if scheme.startswith("postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    return url
+
+def make_async_engine(url: str):
+    from sqlalchemy.ext.asyncio import create_async_engine
+
+    new_engine = create_async_engine(url, **engine_options(url, TimedAsyncAdaptedQueuePool))
+    if is_sqlite(url):
+        event.listen(new_engine.sync_engine, "connect", apply_sqlite_pragmas)
+    return new_engine
+
+# 選用的 async engine，需另外安裝 aiosqlite 或 asyncpg
+async_engine = None
+async_read_engine = None
+AsyncSessionLocal = None
+AsyncReadSessionLocal = None
+if settings.async_database:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+
+    ASYNC_DATABASE_URL = settings.async_database_url or to_async_url(DATABASE_URL)
+    async_engine = make_async_engine(ASYNC_DATABASE_URL)
+    async_read_engine = make_async_engine(to_async_url(settings.read_database_url)) if has_read_replica else async_engine
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+    AsyncReadSessionLocal = async_sessionmaker(async_read_engine, autoflush=False, expire_on_commit=False)
+
+def sync_engines() -> list:
+    """所有使用中的 engine (async engine 取其 sync_engine)，不重複"""
+    engines = [engine, read_engine]
+    if async_engine is not None:
+        engines += [async_engine.sync_engine, async_read_engine.sync_engine]
+    return list(dict.fromkeys(engines))
+
+def dispose_pools_after_fork():
+    """fork 出的子行程 (例如 gunicorn --preload 的 worker) 不可沿用父行程連線池中的連線，
+    close=False 只丟棄連線池、不關閉父行程仍在使用的連線
+    """
+    for target in sync_engines():
+        target.dispose(close=False)
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=dispose_pools_after_fork)
+
+def warm_up_pool(connections: int, target=None):
+    """同時取出 connections 條連線再歸還，讓連線池預先建立好連線 (SQLite 的 PRAGMA 也在此時套用)"""
+    with ExitStack() as stack:
+        for _ in range(connections):
+            stack.enter_context((target or engine).connect()).execute(text("SELECT 1"))
+
+async def warm_up_async_pool(connections: int, target=None):
+    async with AsyncExitStack() as stack:
+        for _ in range(connections):
+            connection = await stack.enter_async_context((target or async_engine).connect())
+            await connection.execute(text("SELECT 1"))
+
+def pool_stats() -> dict:
+    """目前處理請求所用連線池的狀態與等待時間統計"""
+    active_engine = async_engine.sync_engine if async_engine is not None else engine
+    return pool_metrics.snapshot(active_engine.pool)
+
+class ThreadPoolSession:
+    """以 threadpool 執行同步 Session，提供與 AsyncSession 相同的 run_sync 介面"""
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    async def run_sync(self, fn, *args, **kwargs):
+        return await run_in_threadpool(self._call, fn, *args, **kwargs)
+
+    def _call(self, fn, *args, **kwargs):
+        result = fn(self.session, *args, **kwargs)
+        # 每次呼叫結束即結束交易、把連線還給連線池；
+        # 否則持有連線的請求在下一次 run_sync 時要排隊等 thread，
+        # 而 thread 又被等連線的請求佔住，高併發時會互相卡死
+        self.session.commit()
+        return result
+
+    async def close(self):
+        await run_in_threadpool(self.session.close)
+
+@asynccontextmanager
+async def open_async_db(read_only: bool = False):
+    """開啟 async 路由用的 session，read_only 時連到唯讀副本 (未設定副本時仍為主資料庫)
+    只透過 `await db.run_sync(func, ...)` 存取資料庫，
+    啟用 async_database 時為 AsyncSession，否則為 ThreadPoolSession
+    """
+    async_factory = AsyncReadSessionLocal if read_only else AsyncSessionLocal
+    if async_factory is not None:
+        async with async_factory() as session:
+            yield session
+    else:
+        db = ThreadPoolSession((ReadSessionLocal if read_only else SessionLocal)())
+        try:
+            yield db
+        finally:
+            await db.close()
+
+# 取得 DB session 的依賴 (async 路由使用)，一律連到主資料庫
+async def get_async_db():
+    async with open_async_db() as db:
         yield db
-    finally:
-        db.close()
 
 class User(Base):
     __tablename__ = "users"
@@ -34,6 +234,8 @@ class User(Base):
     email = Column(String, unique=True, index=True, nullable=False)
     hashed_password = Column(String, nullable=False)
     name = Column(String, nullable=False)
+    token_version = Column(Integer, nullable=False, default=0, server_default="0")  # 遞增後舊的 access token 全部失效
+    todos_version = Column(Integer, nullable=False, default=0, server_default="0")  # todo 每次異動都遞增，用於 GET /todos 的 ETag
 
     todos = relationship("Todo", back_populates="owner")
 
@@ -45,15 +247,72 @@ class Todo(Base):
     description = Column(String)
     status = Column(Integer, default=0)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    updated_at = Column(DateTime, default=datetime.utcnow)
+    deleted_at = Column(DateTime, nullable=True)  # 刪除時只標記 (tombstone)，讓 GET /todos/changes 能回報刪除
+    version = Column(Integer, nullable=False, default=0, server_default="0")  # 最後一次異動時用戶的 todos_version
 
     owner = relationship("User", back_populates="todos")
 
+    __table_args__ = (
+        # GET /todos 的 keyset 分頁 (不篩選狀態) 與依 owner_id 查詢
+        Index("ix_todos_owner_id_id", "owner_id", "id"),
+        # GET /todos 的 keyset 分頁與狀態篩選
+        Index("ix_todos_owner_status_id", "owner_id", "status", "id"),
+        # GET /todos/changes 依版本號取出異動
+        Index("ix_todos_owner_version_id", "owner_id", "version", "id"),
+    )
+
 class PasswordResetToken(Base):
     __tablename__ = "password_reset_tokens"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     email = Column(String, nullable=False, index=True)
-    token = Column(String, nullable=False, unique=True, index=True)
+    token_hash = Column(LargeBinary(32), nullable=False, unique=True)  # SHA-256(token)，不儲存原始 token
     expires_at = Column(DateTime, nullable=False)
     used = Column(Integer, default=0)  # 0=未使用, 1=已使用
-    created_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        # 清除過期 token 時依 expires_at 範圍查詢
+        Index("ix_password_reset_tokens_expires_at", "expires_at"),
+    )
+
+class OutboundMail(Base):
+    """待寄出的郵件 (由 mailer.MailDispatcher 在背景寄送，寄出後刪除)"""
+    __tablename__ = "outbound_mails"
+
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    to_email = Column(String, nullable=False)
+    subject = Column(String, nullable=False)
+    body = Column(String, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow, index=True)
+    last_error = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+SCHEMA_LOCK_KEY = 20250601  # pg_advisory_lock 使用的 key
+
+@contextmanager
+def schema_lock(bind=None):
+    """同一時間只讓一個 process 建立 / 升級資料表，多個 worker 同時啟動時 DDL 不會互相衝突
+    PostgreSQL 使用 advisory lock，SQLite 檔案使用資料庫旁的 .lock 檔
+    """
+    bind = bind or engine
+    if bind.dialect.name == "postgresql":
+        with bind.connect() as conn:
+            conn.execute(text("SELECT pg_advisory_lock(:key)"), {"key": SCHEMA_LOCK_KEY})
+            try:
+                yield
+            finally:
+                conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": SCHEMA_LOCK_KEY})
+        return
+    database = bind.url.database
+    if bind.dialect.name != "sqlite" or not database or database == ":memory:" or fcntl is None:
+        yield
+        return
+    with open(f"{database}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,109 @@
+import json
+import re
+import time
+from collections import Counter, deque
+from contextvars import ContextVar
+from itertools import count
+from config import settings
+from metrics import add_query_observer
+
+# 開發環境用的 SQL profiler
+# 記錄每個請求送出的所有 SQL 與耗時，同一種 SQL 重複出現 sql_profiler_repeat_threshold 次以上時視為 N+1 並印出警告
+# 回應會附上 Server-Timing / X-DB-Query-Count header，完整內容可在 GET /debug/sql-profiles 查看
+
+_IN_LIST = re.compile(r"\((?:\s*[?%]s?\s*,)+\s*[?%]s?\s*\)|\((?:\s*:\w+\s*,)+\s*:\w+\s*\)")
+_SPACES = re.compile(r"\s+")
+
+def statement_shape(statement: str) -> str:
+    """將 SQL 正規化為「形狀」：合併空白，IN (?, ?, ?) 視為 IN (?)"""
+    return _IN_LIST.sub("(?)", _SPACES.sub(" ", statement).strip())
+
+class QueryProfile:
+    """單一請求的 SQL 紀錄"""
+
+    _ids = count(1)
+
+    def __init__(self, method: str, path: str):
+        self.id = next(self._ids)
+        self.method = method
+        self.path = path
+        self.queries: list[tuple[str, float]] = []
+        self.duration = 0.0
+
+    @property
+    def query_count(self) -> int:
+        return len(self.queries)
+
+    @property
+    def query_seconds(self) -> float:
+        return sum(elapsed for _, elapsed in self.queries)
+
+    def repeated_statements(self, threshold: int | None = None) -> dict[str, int]:
+        """出現 threshold 次以上的 SQL 形狀與其次數"""
+        threshold = threshold or settings.sql_profiler_repeat_threshold
+        shapes = Counter(statement_shape(statement) for statement, _ in self.queries)
+        return {shape: n for shape, n in shapes.items() if n >= threshold}
+
+    def server_timing(self) -> str:
+        return (f'db;dur={self.query_seconds * 1000:.3f};desc="{self.query_count} queries", '
+                f'app;dur={self.duration * 1000:.3f}')
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "duration_ms": round(self.duration * 1000, 3),
+            "query_count": self.query_count,
+            "query_ms": round(self.query_seconds * 1000, 3),
+            "repeated": self.repeated_statements(),
+            "queries": [{"sql": statement, "ms": round(elapsed * 1000, 3)} for statement, elapsed in self.queries],
+        }
+
+_current_profile: ContextVar[QueryProfile | None] = ContextVar("sql_profile", default=None)
+recent_profiles: deque[QueryProfile] = deque(maxlen=100)
+
+def _record_query(statement: str, elapsed: float):
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.queries.append((statement, elapsed))
+
+class SQLProfilerMiddleware:
+    """記錄每個請求的 SQL，並在回應 header 附上查詢數量與耗時"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith("/debug/"):
+            return await self.app(scope, receive, send)
+
+        profile = QueryProfile(scope["method"], scope["path"])
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                profile.duration = time.perf_counter() - start
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", profile.server_timing().encode()),
+                    (b"x-db-query-count", str(profile.query_count).encode()),
+                    (b"x-sql-profile-id", str(profile.id).encode()),
+                ]
+            await send(message)
+
+        token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+            recent_profiles.append(profile)
+            repeated = profile.repeated_statements()
+            if repeated:
+                print(f"[SQL profiler] 可能的 N+1：{profile.method} {profile.path} "
+                      f"共 {profile.query_count} 筆 SQL，重複的 SQL：{json.dumps(repeated, ensure_ascii=False)}")
+
+profiler_enabled = settings.environment == "development" and settings.sql_profiler_enabled
+
+if profiler_enabled:
+    # SQL 的計時由 metrics 的 cursor hook 負責，這裡只記錄到目前請求的 profile
+    add_query_observer(_record_query)
@@ -0,0 +1,135 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from fastapi import HTTPException, Request, status
+from config import settings
+
+# Token bucket 限流
+# 規則格式為 "次數/單位"，例如 "5/minute"：桶子容量 5，每分鐘補滿 5 個 token
+# 預設以 in-process 記憶體儲存 (每個 worker 各自計算)，設定 rate_limit_backend=redis 可多個 worker 共用
+
+PERIODS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+@lru_cache(maxsize=None)
+def parse_rule(rule: str) -> tuple[int, float]:
+    """將 "5/minute" 解析為 (容量, 每秒補充的 token 數)"""
+    count, _, period = rule.partition("/")
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip().rstrip("s")]
+
+class MemoryBackend:
+    """以記憶體儲存各 key 的 token bucket，超過 max_keys 時淘汰最久未使用的"""
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: OrderedDict[str, tuple[float, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str, capacity: int, refill_rate: float) -> float:
+        """取用一個 token；成功回傳 0，否則回傳需要等待的秒數"""
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated_at) * refill_rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                retry_after = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                retry_after = (1 - tokens) / refill_rate
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return retry_after
+
+class RedisBackend:
+    """以 Redis 儲存 token bucket，讓多個 worker / instance 共用限流狀態 (需安裝 redis)"""
+
+    # 以 Lua script 原子地補充並取用 token
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local refill_rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated_at = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated_at) * refill_rate)
+    local retry_after = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+    else
+        retry_after = (1 - tokens) / refill_rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated_at', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / refill_rate) + 1)
+    return tostring(retry_after)
+    """
+
+    def __init__(self, url: str):
+        import redis
+
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def acquire(self, key: str, capacity: int, refill_rate: float) -> float:
+        return float(self._script(keys=[f"ratelimit:{key}"], args=[capacity, refill_rate, time.time()]))
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if settings.rate_limit_backend == "redis":
+                _backend = RedisBackend(settings.rate_limit_redis_url)
+            else:
+                _backend = MemoryBackend()
+        return _backend
+
+def client_ip(request: Request) -> str:
+    """限流用的來源 IP
+    每個代理都會把它看到的連線來源附加在 X-Forwarded-For 最後面，
+    由右往左數第 rate_limit_trusted_proxy_count 個才是最外層受信任代理看到的位址；
+    更左邊的內容由用戶端自行填寫，可以偽造。位址數量不足時改用實際連線的位址
+    """
+    if settings.rate_limit_trust_forwarded_for:
+        hops = [
+            hop.strip()
+            for value in request.headers.getlist("x-forwarded-for")
+            for hop in value.split(",")
+            if hop.strip()
+        ]
+        proxies = settings.rate_limit_trusted_proxy_count
+        if 0 < proxies <= len(hops):
+            return hops[-proxies]
+    return request.client.host if request.client else "unknown"
+
+def enforce(key: str, rule: str):
+    """超過限制時丟出 429，並在 Retry-After 告知需要等待的秒數"""
+    if not settings.rate_limit_enabled or not rule:
+        return
+    capacity, refill_rate = parse_rule(rule)
+    retry_after = get_backend().acquire(key, capacity, refill_rate)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many requests, please retry later",
+            headers={"Retry-After": str(math.ceil(retry_after))},
+        )
+
+class RateLimitByIP:
+    """依來源 IP 限流的 dependency，在讀取資料庫或雜湊密碼之前執行"""
+
+    def __init__(self, action: str, rule_setting: str):
+        self.action = action
+        self.rule_setting = rule_setting
+
+    async def __call__(self, request: Request):
+        enforce(f"{self.action}:ip:{client_ip(request)}", getattr(settings, self.rule_setting))
+
+def limit_by_user(action: str, email: str, rule_setting: str):
+    """依帳號 (email) 限流，於路由一開始呼叫"""
+    enforce(f"{action}:user:{email.lower()}", getattr(settings, rule_setting))
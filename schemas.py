@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr, constr, Field
-from typing import Optional, Any, List
+from typing import Optional, List, Generic, TypeVar
 
 # 會員註冊用
 class UserCreate(BaseModel):
@@ -55,10 +55,32 @@ class TodoOut(BaseModel):
 
     model_config = {"from_attributes": True}
 
-class APIResponse(BaseModel):
+DataT = TypeVar("DataT")
+
+# 統一的回傳格式，可用 APIResponse[TodoOut] 指定 data 的型別
+class APIResponse(BaseModel, Generic[DataT]):
     code: int
     message: str
-    data: Optional[Any] = None
+    data: Optional[DataT] = None
+
+# 登入成功回傳的 data
+class LoginData(BaseModel):
+    access_token: str
+    name: str
+    token_type: str
+
+# GET /todos 用，next_cursor 為 None 表示沒有下一頁
+class TodoListResponse(APIResponse[List[TodoOut]]):
+    next_cursor: Optional[str] = None
+
+class TodoSearchResponse(APIResponse[List[TodoOut]]):
+    next_offset: Optional[int] = None  # 還有下一頁時，下一次查詢使用的 offset
+
+class TodoChanges(BaseModel):
+    upserts: List[TodoOut]  # 新增或修改過的 todo
+    deleted: List[int]  # 已刪除的 todo id
+    next_since: str  # 下一次同步時傳入的 since
+    has_more: bool  # 異動超過 limit 筆時為 true，應立即以 next_since 繼續取得
 
 # 直接定義一個 Todo 陣列的 schema
 TodoCreateList = List[TodoCreate]
@@ -73,6 +95,11 @@ class TodoStatusUpdate(BaseModel):
 # 直接定義一個 TodoUpdate 陣列的 schema
 TodoUpdateList = List[TodoUpdate]
 
+# 批次刪除 / 批次狀態更新的結果
+class TodoBatchResult(BaseModel):
+    count: int
+    ids: List[int]
+
 # 忘記密碼請求用
 class ForgotPasswordRequest(BaseModel):
     email: EmailStr
@@ -0,0 +1,177 @@
+import re
+from sqlalchemy import Text, bindparam, cast, column, func, inspect, literal, literal_column, or_, select, table, text, update
+from sqlalchemy.orm import Session
+from models import Todo
+
+# Todo 全文搜尋 (GET /todos/search)
+# 索引的詞都加上固定長度的用戶 id 前綴 (例如 "000000000042milk")，
+# 每個詞的 posting list 只包含該用戶的 todo，搜尋成本與整張表的大小無關
+# 斷詞在應用程式中進行：英數字以單字為單位，中日韓文字同時索引單字與相鄰兩字 (bigram)
+# SQLite：FTS5 虛擬資料表 todos_fts (rowid = todos.id)
+# PostgreSQL：todos.search_terms tsvector 欄位加上 GIN 索引 (PostgreSQL 專用型別在使用時才匯入)
+# 索引由 crud 中新增、修改、刪除 todo 的函式同步更新，已刪除的 todo 不在索引中
+
+OWNER_PREFIX_WIDTH = 12
+CHUNK_SIZE = 500  # 每次 IN 查詢的 id 數量
+
+_CJK = "぀-ヿ㐀-䶿一-鿿가-힯豈-﫿"  # 假名、中日韓漢字、韓文
+_TOKENS = re.compile(rf"[{_CJK}]+|[^\W_{_CJK}]+")
+_CJK_RUN = re.compile(rf"[{_CJK}]")
+
+todos_fts = table("todos_fts", column("rowid"), column("title"), column("description"))
+todos_search = table("todos", column("id"), column("search_terms"))
+search_terms = todos_search.c.search_terms
+
+def tokenize(value: str | None, query: bool = False) -> list[str]:
+    """斷詞：英數字轉小寫後整個單字為一個詞；中日韓文字索引時產生單字與 bigram，查詢時只用 bigram (單一字時用單字)"""
+    terms = []
+    for run in _TOKENS.findall((value or "").lower()):
+        if not _CJK_RUN.match(run):
+            terms.append(run)
+            continue
+        bigrams = [run[i:i + 2] for i in range(len(run) - 1)]
+        if query:
+            terms += bigrams or [run]
+        else:
+            terms += list(run) + bigrams
+    return terms
+
+def owner_terms(owner_id: int, value: str | None, query: bool = False) -> list[str]:
+    prefix = f"{owner_id:0{OWNER_PREFIX_WIDTH}d}"
+    return list(dict.fromkeys(prefix + term for term in tokenize(value, query)))
+
+def dialect_name(db) -> str:
+    return db.get_bind().dialect.name if isinstance(db, Session) else db.dialect.name
+
+def create_search_index(conn):
+    """建立搜尋索引；第一次建立時把既有的 todo 寫入索引 (由 migrations 呼叫)"""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        created = not inspect(conn).has_table("todos_fts")
+        conn.execute(text("CREATE VIRTUAL TABLE IF NOT EXISTS todos_fts USING fts5(title, description)"))
+    elif dialect == "postgresql":
+        created = "search_terms" not in {c["name"] for c in inspect(conn).get_columns("todos")}
+        conn.execute(text("ALTER TABLE todos ADD COLUMN IF NOT EXISTS search_terms tsvector"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_todos_search_terms ON todos USING gin (search_terms)"))
+    else:
+        return
+    if created:
+        last_id = 0
+        while True:
+            rows = conn.execute(
+                select(Todo.id, Todo.owner_id, Todo.title, Todo.description)
+                .where(Todo.id > last_id, Todo.deleted_at.is_(None)).order_by(Todo.id).limit(5000)
+            ).mappings().all()
+            if not rows:
+                break
+            index_todos(conn, rows, replace=False)
+            last_id = rows[-1]["id"]
+
+def search_index_exists(conn) -> bool:
+    """檢查搜尋索引是否存在 (其他資料庫不使用索引，視為存在)"""
+    dialect = conn.dialect.name
+    if dialect == "sqlite":
+        return inspect(conn).has_table("todos_fts")
+    if dialect == "postgresql":
+        return "ix_todos_search_terms" in {index["name"] for index in inspect(conn).get_indexes("todos")}
+    return True
+
+def index_todos(db, rows, replace: bool = True):
+    """寫入或更新 todo 的索引，rows 需包含 id / owner_id / title / description
+    新建立的 todo 不會已在索引中，可傳入 replace=False 省去刪除舊索引
+    """
+    if not rows:
+        return
+    dialect = dialect_name(db)
+    if dialect == "sqlite":
+        if replace:
+            unindex_todos(db, [row["id"] for row in rows])
+        db.execute(todos_fts.insert(), [
+            {
+                "rowid": row["id"],
+                "title": " ".join(owner_terms(row["owner_id"], row["title"])),
+                "description": " ".join(owner_terms(row["owner_id"], row["description"])),
+            }
+            for row in rows
+        ])
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import ARRAY
+
+        # array_to_tsvector 直接使用已斷好的詞，不經過 PostgreSQL 的 parser
+        title_vector = func.setweight(func.array_to_tsvector(bindparam("title_terms", type_=ARRAY(Text))), "A")
+        description_vector = func.setweight(func.array_to_tsvector(bindparam("description_terms", type_=ARRAY(Text))), "B")
+        db.execute(
+            update(todos_search).where(todos_search.c.id == bindparam("todo_id"))
+            .values(search_terms=title_vector.op("||")(description_vector)),
+            [
+                {
+                    "todo_id": row["id"],
+                    "title_terms": owner_terms(row["owner_id"], row["title"]),
+                    "description_terms": owner_terms(row["owner_id"], row["description"]),
+                }
+                for row in rows
+            ]
+        )
+
+def unindex_todos(db, ids: list[int]):
+    """從索引移除已刪除的 todo (PostgreSQL 的索引欄位在 todos 上，查詢時已排除已刪除的 todo)"""
+    if ids and dialect_name(db) == "sqlite":
+        for start in range(0, len(ids), CHUNK_SIZE):
+            db.execute(todos_fts.delete().where(todos_fts.c.rowid.in_(ids[start:start + CHUNK_SIZE])))
+
+def fts5_query(terms: list[str], prefix_last: bool) -> str:
+    phrases = ['"' + term.replace('"', '""') + '"' for term in terms]
+    if prefix_last:
+        phrases[-1] += "*"
+    return " AND ".join(phrases)
+
+def tsquery(terms: list[str], prefix_last: bool) -> str:
+    lexemes = ["'" + term.replace("\\", "\\\\").replace("'", "''") + "'" for term in terms]
+    if prefix_last:
+        lexemes[-1] += ":*"
+    return " & ".join(lexemes)
+
+def search_todos(db: Session, owner_id: int, q: str, limit: int, offset: int = 0):
+    """依相關度排序搜尋用戶的 todo，所有關鍵字都需符合 (最後一個英數字關鍵字可只符合開頭)
+    多取一筆讓呼叫端判斷是否還有下一頁，回傳欄位 tuple (順序同 crud.TODO_COLUMNS)
+    """
+    terms = owner_terms(owner_id, q, query=True)
+    if not terms:
+        return []
+    # 最後一個詞是英數字 (可能還在輸入中) 時以前綴比對
+    last_token = _TOKENS.findall(q.lower())[-1]
+    prefix_last = not _CJK_RUN.match(last_token) and q.rstrip().lower().endswith(last_token)
+
+    columns = (Todo.id, Todo.title, Todo.description, Todo.status, Todo.owner_id)
+    dialect = dialect_name(db)
+    if dialect == "sqlite":
+        fts_table = literal_column("todos_fts")
+        query = (
+            select(*columns)
+            .select_from(todos_fts)
+            .join(Todo, Todo.id == todos_fts.c.rowid)
+            # 詞已帶用戶前綴，仍以 owner_id 再確認一次，避免索引與資料表不一致時回傳其他用戶的 todo
+            .where(fts_table.op("MATCH")(fts5_query(terms, prefix_last)), Todo.owner_id == owner_id)
+            # bm25 越小越相關，標題權重高於描述
+            .order_by(func.bm25(fts_table, 10.0, 1.0), Todo.id.desc())
+        )
+    elif dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import TSQUERY
+
+        ts_query = cast(literal(tsquery(terms, prefix_last)), TSQUERY)
+        query = (
+            select(*columns)
+            .where(Todo.owner_id == owner_id, Todo.deleted_at.is_(None), search_terms.op("@@")(ts_query))
+            .order_by(func.ts_rank(search_terms, ts_query).desc(), Todo.id.desc())
+        )
+    else:
+        # 其他資料庫沒有全文索引，在該用戶的 todo 中以 LIKE 比對
+        query = (
+            select(*columns)
+            .where(Todo.owner_id == owner_id, Todo.deleted_at.is_(None), *[
+                or_(Todo.title.contains(word, autoescape=True), Todo.description.contains(word, autoescape=True))
+                for word in q.split()
+            ])
+            .order_by(Todo.id.desc())
+        )
+    return db.execute(query.limit(limit + 1).offset(offset)).all()
@@ -0,0 +1,19 @@
+import orjson
+from fastapi.responses import Response
+from crud import TODO_COLUMNS
+
+# 列表回應的快速序列化：直接把查詢結果的欄位 tuple 轉成 JSON bytes，
+# 不經過 ORM 物件與逐筆的 Pydantic 驗證
+
+TODO_FIELDS = tuple(column.key for column in TODO_COLUMNS)
+
+# fastapi.responses.ORJSONResponse 已棄用 (每次使用都會發出 FastAPIDeprecationWarning)，保留這個精簡的版本
+class ORJSONResponse(Response):
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+def todo_rows(rows) -> list:
+    """將 select(*TODO_COLUMNS) 的結果轉成 dict 清單 (欄位順序與 TodoOut 相同)"""
+    return [dict(zip(TODO_FIELDS, row)) for row in rows]
@@ -0,0 +1,140 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from sqlalchemy import delete, or_, select
+from config import settings
+from models import SessionLocal, OutboundMail, PasswordResetToken, Todo
+
+# 定期清除過期的資料：過期或已使用的密碼重設 token、超過保留期限的 todo tombstone 與不再重試的郵件
+# 每批最多刪除 sweep_batch_size 筆並各自 commit，避免長時間鎖住資料表
+
+class SweepMetrics:
+    """清除作業的統計"""
+
+    def __init__(self):
+        self.runs = 0
+        self.deleted_total = 0
+        self.last_deleted = 0
+        self.last_duration_seconds = 0.0
+        self.last_run_at: datetime | None = None
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, deleted: int, duration: float):
+        with self._lock:
+            self.runs += 1
+            self.deleted_total += deleted
+            self.last_deleted = deleted
+            self.last_duration_seconds = duration
+            self.last_run_at = datetime.utcnow()
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "runs": self.runs,
+                "deleted_total": self.deleted_total,
+                "last_deleted": self.last_deleted,
+                "last_duration_seconds": round(self.last_duration_seconds, 6),
+                "last_run_at": self.last_run_at.isoformat() if self.last_run_at else None,
+                "errors": self.errors,
+            }
+
+class Sweeper:
+    """在背景 thread 定期分批刪除 expired_ids() 選出的資料列，子類別指定 model 與條件"""
+
+    model = None
+    thread_name = "sweeper"
+
+    def __init__(self, session_factory=SessionLocal):
+        self.session_factory = session_factory
+        self.metrics = SweepMetrics()
+        self._stopping = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=self.thread_name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 5):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def _run(self):
+        while not self._stopping.wait(settings.sweep_interval_seconds):
+            try:
+                self.sweep()
+            except Exception as e:
+                self.metrics.record_error()
+                print(f"{self.thread_name} 清除失敗: {e}")
+
+    def expired_ids(self, batch_size: int):
+        raise NotImplementedError
+
+    def sweep(self) -> int:
+        """分批刪除過期的資料，回傳刪除的數量"""
+        start = time.perf_counter()
+        deleted = 0
+        batch_size = settings.sweep_batch_size
+        db = self.session_factory()
+        try:
+            while not self._stopping.is_set():
+                result = db.execute(
+                    delete(self.model).where(self.model.id.in_(self.expired_ids(batch_size))),
+                    execution_options={"synchronize_session": False}
+                )
+                db.commit()
+                deleted += result.rowcount
+                if result.rowcount < batch_size:
+                    break
+        finally:
+            db.close()
+        self.metrics.record(deleted, time.perf_counter() - start)
+        return deleted
+
+class ResetTokenSweeper(Sweeper):
+    """清除過期或已使用的密碼重設 token"""
+
+    model = PasswordResetToken
+    thread_name = "reset-token-sweeper"
+
+    def expired_ids(self, batch_size: int):
+        return select(PasswordResetToken.id).where(
+            or_(PasswordResetToken.expires_at <= datetime.utcnow(), PasswordResetToken.used == 1)
+        ).limit(batch_size).scalar_subquery()
+
+class TodoTombstoneSweeper(Sweeper):
+    """清除超過 todo_tombstone_retention_days 的已刪除 todo"""
+
+    model = Todo
+    thread_name = "todo-tombstone-sweeper"
+
+    def expired_ids(self, batch_size: int):
+        cutoff = datetime.utcnow() - timedelta(days=settings.todo_tombstone_retention_days)
+        return select(Todo.id).where(Todo.deleted_at <= cutoff).limit(batch_size).scalar_subquery()
+
+class DeadMailSweeper(Sweeper):
+    """清除失敗 mail_max_attempts 次、超過 mail_dead_letter_retention_days 的郵件
+    (放棄重試時 next_attempt_at 設為當時的時間)
+    """
+
+    model = OutboundMail
+    thread_name = "dead-mail-sweeper"
+
+    def expired_ids(self, batch_size: int):
+        cutoff = datetime.utcnow() - timedelta(days=settings.mail_dead_letter_retention_days)
+        return select(OutboundMail.id).where(
+            OutboundMail.attempts >= settings.mail_max_attempts, OutboundMail.next_attempt_at <= cutoff
+        ).limit(batch_size).scalar_subquery()
+
+reset_token_sweeper = ResetTokenSweeper()
+todo_tombstone_sweeper = TodoTombstoneSweeper()
+dead_mail_sweeper = DeadMailSweeper()
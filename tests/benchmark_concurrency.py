@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+高併發負載測試
+分別以 threadpool 模式與 async engine 模式啟動 uvicorn，
+用大量同時連線打 GET /todos，比較每秒請求數與 p50 / p99 延遲
+需要安裝 httpx 與 aiosqlite (PostgreSQL 則需 asyncpg，透過 BENCH_DATABASE_URL 指定)
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmark_utils import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = int(os.getenv("BENCH_PORT", "8765"))
+CONCURRENCY = int(os.getenv("CONCURRENCY", "500"))
+DURATION = float(os.getenv("DURATION", "15"))
+TODOS = int(os.getenv("TODOS", "50"))
+
+def start_server(async_database: bool, database_url: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SECRET_KEY=os.getenv("SECRET_KEY", "benchmark-secret-key"),
+        DATABASE_URL=database_url,
+        ASYNC_DATABASE=str(async_database).lower(),
+        RATE_LIMIT_ENABLED="false",
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning",
+         "--backlog", str(CONCURRENCY * 2)],
+        cwd=ROOT, env=env,
+    )
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/health")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("伺服器啟動失敗")
+
+def prepare(base_url: str) -> dict:
+    """建立測試帳號與 todo，回傳 Authorization header"""
+    user = {"email": "load@example.com", "password": "123456", "name": "load"}
+    httpx.post(f"{base_url}/register", json=user)
+    token = httpx.post(f"{base_url}/login", json=user).json()["data"]["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    httpx.post(f"{base_url}/todos", json=[{"title": f"todo {i}"} for i in range(TODOS)], headers=headers)
+    return headers
+
+async def run_load(base_url: str, headers: dict):
+    latencies = []
+    errors = 0
+    deadline = time.perf_counter() + DURATION
+    limits = httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+
+    async with httpx.AsyncClient(base_url=base_url, headers=headers, limits=limits, timeout=30) as client:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    response = await client.get("/todos")
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+        elapsed = time.perf_counter() - start
+    return latencies, errors, elapsed
+
+def benchmark(async_database: bool):
+    database_url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'load.db')}"
+    server = start_server(async_database, database_url)
+    try:
+        base_url = f"http://127.0.0.1:{PORT}"
+        headers = prepare(base_url)
+        latencies, errors, elapsed = asyncio.run(run_load(base_url, headers))
+    finally:
+        server.terminate()
+        server.wait()
+
+    mode = "async engine" if async_database else "threadpool"
+    print(f"{mode:<13} {len(latencies) / elapsed:8.1f} req/s  "
+          f"p50={percentile(latencies, 50):8.1f}ms  p99={percentile(latencies, 99):8.1f}ms  錯誤={errors}")
+
+def main():
+    print(f"=== GET /todos 併發負載測試 ({CONCURRENCY} 連線, {DURATION:.0f}s) ===")
+    benchmark(async_database=False)
+    benchmark(async_database=True)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+登入延遲壓力測試腳本
+同時送出大量 /login 與 GET /todos 請求，量測兩者的 p50 / p99 延遲
+在改動前後分別對同一台伺服器執行，即可比較 bcrypt 對其他請求的影響
+伺服器需以 RATE_LIMIT_ENABLED=false 啟動，否則登入請求會被限流
+"""
+
+import requests
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmark_utils import percentile
+
+# API 基礎 URL
+BASE_URL = os.getenv("API_BASE_URL", "http://localhost:8000")
+
+EMAIL = "bench@example.com"
+PASSWORD = "123456"
+LOGIN_REQUESTS = int(os.getenv("LOGIN_REQUESTS", "200"))
+TODO_REQUESTS = int(os.getenv("TODO_REQUESTS", "1000"))
+CONCURRENCY = int(os.getenv("CONCURRENCY", "50"))
+
+def prepare():
+    """建立測試帳號並取得 token"""
+    requests.post(f"{BASE_URL}/register", json={"email": EMAIL, "password": PASSWORD, "name": "bench"})
+    response = requests.post(f"{BASE_URL}/login", json={"email": EMAIL, "password": PASSWORD})
+    return response.json()["data"]["access_token"]
+
+def timed(method, url, **kwargs):
+    """送出請求並回傳 (狀態碼, 耗時毫秒)"""
+    start = time.perf_counter()
+    response = requests.request(method, url, **kwargs)
+    return response.status_code, (time.perf_counter() - start) * 1000
+
+def report(name, results):
+    latencies = [elapsed for _, elapsed in results]
+    codes = {}
+    for code, _ in results:
+        codes[code] = codes.get(code, 0) + 1
+    print(f"{name:<8} n={len(results):<6} p50={percentile(latencies, 50):8.1f}ms "
+          f"p99={percentile(latencies, 99):8.1f}ms 狀態碼={codes}")
+
+def main():
+    print("=== 登入混合負載測試 ===")
+    token = prepare()
+    headers = {"Authorization": f"Bearer {token}"}
+
+    jobs = [("login", "POST", f"{BASE_URL}/login", {"json": {"email": EMAIL, "password": PASSWORD}})] * LOGIN_REQUESTS
+    jobs += [("todos", "GET", f"{BASE_URL}/todos", {"headers": headers})] * TODO_REQUESTS
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        futures = [(name, pool.submit(timed, method, url, **kwargs)) for name, method, url, kwargs in jobs]
+        results = {"login": [], "todos": []}
+        for name, future in futures:
+            results[name].append(future.result())
+    total = time.perf_counter() - start
+
+    report("login", results["login"])
+    report("todos", results["todos"])
+    print(f"總耗時 {total:.2f}s, 吞吐量 {len(jobs) / total:.1f} req/s")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+GET /todos 序列化基準測試
+建立一個有 10k 筆 todo 的用戶，量測完整列表的回應時間
+可在改動前後分別執行比較
+"""
+
+import os
+
+from benchmark_utils import setup_environment, summarize, timed_call, create_user_and_login, seed_todos
+
+setup_environment()
+
+from fastapi.testclient import TestClient
+import main
+import migrations
+
+TODOS = int(os.getenv("TODOS", "10000"))
+ROUNDS = int(os.getenv("ROUNDS", "30"))
+
+def main_benchmark():
+    print(f"=== GET /todos 序列化基準測試 ({TODOS} 筆) ===")
+    migrations.upgrade()
+    client = TestClient(main.app)
+    headers = create_user_and_login(client, email="serialize@example.com")
+    seed_todos("serialize@example.com", TODOS)
+
+    samples = []
+    size = 0
+    for _ in range(ROUNDS):
+        response, elapsed = timed_call(client.get, "/todos", headers=headers)
+        assert response.status_code == 200, response.text
+        size = len(response.content)
+        samples.append(elapsed)
+
+    stats = summarize(samples)
+    print(f"p50={stats['p50_ms']:8.1f}ms  p99={stats['p99_ms']:8.1f}ms  平均={stats['mean_ms']:8.1f}ms  回應大小={size / 1024:.0f} KB")
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+全 API 基準測試
+在同一個 process 內建立應用程式 (不需要啟動伺服器)，為 10 / 1k / 100k 筆 todo 的用戶分別量測
+main.py 每個 API 的吞吐量與 p50 / p99 延遲，結果寫成 JSON 方便比較不同版本
+
+預設使用暫存 SQLite，設定 BENCH_DATABASE_URL 可改測 PostgreSQL
+    python tests/benchmark_suite.py
+    DATASETS=10,1000 ROUNDS=50 CONCURRENCY=8 python tests/benchmark_suite.py
+    python tests/benchmark_suite.py --compare results/old.json results/new.json
+需要安裝 httpx
+"""
+
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime
+
+from benchmark_utils import setup_environment, summarize, seed_todos
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASETS = [int(size) for size in os.getenv("DATASETS", "10,1000,100000").split(",")]
+ROUNDS = int(os.getenv("ROUNDS", "30"))
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "5"))  # 註冊 / 登入 / 重設密碼每次都要跑 bcrypt，次數另外設定
+CONCURRENCY = int(os.getenv("CONCURRENCY", "1"))
+OUTPUT = os.getenv("BENCH_OUTPUT") or os.path.join(ROOT, "results", f"benchmark-{datetime.now():%Y%m%d-%H%M%S}.json")
+PASSWORD = "123456"
+
+async def measure(client, requests: list[dict]) -> dict:
+    """以 CONCURRENCY 個並行工作送出請求，回傳延遲統計與每秒請求數"""
+    samples = []
+    errors = {}
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def send(request):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.request(**request)
+            samples.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors[response.status_code] = errors.get(response.status_code, 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(send(request) for request in requests))
+    elapsed = time.perf_counter() - start
+    return {**summarize(samples), "rps": round(len(samples) / elapsed, 1), "errors": errors}
+
+async def login(client, email: str) -> dict:
+    await client.post("/register", json={"email": email, "password": PASSWORD, "name": "bench"})
+    response = await client.post("/login", json={"email": email, "password": PASSWORD})
+    return {"Authorization": f"Bearer {response.json()['data']['access_token']}"}
+
+async def benchmark_auth(client) -> dict:
+    """與資料量無關的 API：註冊、登入、忘記 / 重設密碼"""
+    from auth import create_password_reset_token
+    from models import SessionLocal
+
+    run_id = int(time.time() * 1000)
+    email = f"auth-{run_id}@example.com"
+    await login(client, email)
+
+    db = SessionLocal()
+    try:
+        reset_tokens = [create_password_reset_token(email, db) for _ in range(BCRYPT_ROUNDS)]
+    finally:
+        db.close()
+
+    return {
+        "POST /register": await measure(client, [
+            {"method": "POST", "url": "/register",
+             "json": {"email": f"register-{run_id}-{i}@example.com", "password": PASSWORD, "name": "bench"}}
+            for i in range(BCRYPT_ROUNDS)
+        ]),
+        "POST /login": await measure(client, [
+            {"method": "POST", "url": "/login", "json": {"email": email, "password": PASSWORD}}
+        ] * BCRYPT_ROUNDS),
+        "POST /forgot-password": await measure(client, [
+            {"method": "POST", "url": "/forgot-password", "json": {"email": email}}
+        ] * ROUNDS),
+        "POST /reset-password": await measure(client, [
+            {"method": "POST", "url": "/reset-password", "json": {"token": token, "new_password": PASSWORD}}
+            for token in reset_tokens
+        ]),
+        "GET /health": await measure(client, [{"method": "GET", "url": "/health"}] * ROUNDS),
+        "GET /health/ready": await measure(client, [{"method": "GET", "url": "/health/ready"}] * ROUNDS),
+        "GET /metrics": await measure(client, [
+            {"method": "GET", "url": "/metrics", "headers": {"Authorization": f"Bearer {os.environ['METRICS_TOKEN']}"}}
+        ] * ROUNDS),
+    }
+
+async def benchmark_dataset(client, size: int) -> dict:
+    """為擁有 size 筆 todo 的用戶量測 todo 相關 API"""
+    email = f"dataset-{size}-{int(time.time() * 1000)}@example.com"
+    headers = await login(client, email)
+    start = time.perf_counter()
+    ids = seed_todos(email, size)
+    print(f"  建立 {size} 筆 todo 花費 {time.perf_counter() - start:.1f}s")
+
+    # 刪除用的 todo 另外建立，避免影響資料量
+    disposable = seed_todos(email, ROUNDS * 11)
+    single_delete, batch_delete = disposable[:ROUNDS], disposable[ROUNDS:]
+    batch = ids[:10]
+
+    def request(method, url, **kwargs):
+        return {"method": method, "url": url, "headers": headers, **kwargs}
+
+    # 輪詢用：目前的 ETag 與同步到最新的 next_since (讀取類的量測都在寫入之前，兩者在量測期間不變)
+    etag = (await client.get("/todos", headers=headers)).headers["ETag"]
+    next_since, has_more = None, True
+    while has_more:
+        page = (await client.get("/todos/changes", params={"since": next_since} if next_since else {}, headers=headers)).json()
+        next_since, has_more = page["data"]["next_since"], page["data"]["has_more"]
+
+    results = {
+        "GET /todos": await measure(client, [request("GET", "/todos")] * ROUNDS),
+        "GET /todos?limit=50": await measure(client, [request("GET", "/todos", params={"limit": 50})] * ROUNDS),
+        "GET /todos?status=1&limit=50&order=desc": await measure(client, [
+            request("GET", "/todos", params={"status": 1, "limit": 50, "order": "desc"})
+        ] * ROUNDS),
+        "GET /todos?title_prefix": await measure(client, [
+            request("GET", "/todos", params={"title_prefix": "todo 1", "limit": 50})
+        ] * ROUNDS),
+        "GET /todos/search": await measure(client, [
+            request("GET", "/todos/search", params={"q": "todo 12", "limit": 20})
+        ] * ROUNDS),
+        "GET /todos (If-None-Match 304)": await measure(client, [
+            request("GET", "/todos", headers={**headers, "If-None-Match": etag})
+        ] * ROUNDS),
+        "GET /todos/changes": await measure(client, [request("GET", "/todos/changes")] * ROUNDS),
+        "GET /todos/changes?since": await measure(client, [
+            request("GET", "/todos/changes", params={"since": next_since})
+        ] * ROUNDS),
+        "PUT /todos (10)": await measure(client, [
+            request("PUT", "/todos", json=[{"id": todo_id, "title": f"updated {i}"} for todo_id in batch])
+            for i in range(ROUNDS)
+        ]),
+        "PATCH /todos/status (10)": await measure(client, [
+            request("PATCH", "/todos/status", params={"ids": batch}, json={"status": i % 2}) for i in range(ROUNDS)
+        ]),
+        "PATCH /todos/{id}/status": await measure(client, [
+            request("PATCH", f"/todos/{ids[0]}/status", json={"status": i % 2}) for i in range(ROUNDS)
+        ]),
+        "DELETE /todos/{id}": await measure(client, [
+            request("DELETE", f"/todos/{todo_id}") for todo_id in single_delete
+        ]),
+        "DELETE /todos (10)": await measure(client, [
+            request("DELETE", "/todos", params={"ids": batch_delete[i:i + 10]})
+            for i in range(0, len(batch_delete), 10)
+        ]),
+        "POST /todos (10)": await measure(client, [
+            request("POST", "/todos", json=[{"title": f"new {i}-{j}"} for j in range(10)]) for i in range(ROUNDS)
+        ]),
+    }
+    return results
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(name: str, results: dict):
+    print(f"--- {name} ---")
+    for endpoint, stats in results.items():
+        print(f"{endpoint:<42} {stats['rps']:8.1f} req/s  p50={stats['p50_ms']:8.1f}ms  "
+              f"p99={stats['p99_ms']:8.1f}ms  錯誤={stats['errors'] or '-'}")
+
+async def run(database_url: str) -> dict:
+    import httpx
+    import main
+
+    report = {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "database": database_url.split(":")[0],
+        "async_database": main.settings.async_database,
+        "rounds": ROUNDS,
+        "concurrency": CONCURRENCY,
+        "results": {},
+    }
+    transport = httpx.ASGITransport(app=main.app)
+    async with main.lifespan(main.app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            report["results"]["auth"] = await benchmark_auth(client)
+            print_results("auth", report["results"]["auth"])
+            for size in DATASETS:
+                name = f"todos_{size}"
+                report["results"][name] = await benchmark_dataset(client, size)
+                print_results(name, report["results"][name])
+    return report
+
+def compare(old_path: str, new_path: str):
+    """比較兩次結果的 p50 / p99 變化"""
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"=== {old.get('git_revision')} -> {new.get('git_revision')} ===")
+    for group, results in new["results"].items():
+        for endpoint, stats in results.items():
+            before = old["results"].get(group, {}).get(endpoint)
+            if before is None:
+                continue
+            changes = []
+            for key in ("p50_ms", "p99_ms"):
+                delta = (stats[key] - before[key]) / before[key] * 100 if before[key] else 0.0
+                changes.append(f"{key[:3]} {before[key]:8.1f} -> {stats[key]:8.1f}ms ({delta:+6.1f}%)")
+            print(f"{group:<14} {endpoint:<42} {'  '.join(changes)}")
+
+def main_benchmark():
+    database_url = setup_environment()
+    print(f"=== 全 API 基準測試 ({database_url.split(':')[0]}, 資料量 {DATASETS}, 並行 {CONCURRENCY}) ===")
+    report = asyncio.run(run(database_url))
+    os.makedirs(os.path.dirname(OUTPUT), exist_ok=True)
+    with open(OUTPUT, "w") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果已寫入 {OUTPUT}")
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--compare":
+        compare(sys.argv[2], sys.argv[3])
+    else:
+        main_benchmark()
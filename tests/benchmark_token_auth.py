@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Access token 驗證延遲微基準測試
+比較舊版 (只有 email) 與新版 (含 uid / ver) token 的 decode + 授權耗時
+使用暫存的 SQLite 資料庫，不需要啟動伺服器
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+# 必須在匯入應用程式模組之前設定
+DB_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+os.environ["DATABASE_URL"] = f"sqlite:///{DB_PATH}"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import Base, engine, SessionLocal, User
+import auth
+
+ITERATIONS = int(os.getenv("ITERATIONS", "5000"))
+USERS = int(os.getenv("USERS", "10000"))
+
+def seed():
+    """建立測試用戶，回傳最後一位用戶"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.bulk_insert_mappings(User, [
+        {"email": f"user{i}@example.com", "name": f"user{i}", "hashed_password": "x"}
+        for i in range(USERS)
+    ])
+    db.commit()
+    user = db.query(User).order_by(User.id.desc()).first()
+    db.close()
+    return user
+
+async def measure(name, token, use_cache):
+    # 未命中快取時 get_current_user 經由 open_async_db 開啟 session 查詢用戶，開啟 session 的成本也計入
+    await auth.get_current_user(token)  # 預熱
+    samples = []
+    for _ in range(ITERATIONS):
+        if not use_cache:
+            auth._user_cache.clear()
+        start = time.perf_counter()
+        await auth.get_current_user(token)
+        samples.append((time.perf_counter() - start) * 1_000_000)
+    samples.sort()
+    print(f"{name:<24} p50={samples[len(samples) // 2]:8.1f}µs "
+          f"p99={samples[int(len(samples) * 0.99)]:8.1f}µs")
+
+async def run_all(legacy_token, claims_token):
+    await measure("legacy (email)", legacy_token, use_cache=False)
+    await measure("claims (uid + ver)", claims_token, use_cache=False)
+    await measure("legacy (cached)", legacy_token, use_cache=True)
+    await measure("claims (cached)", claims_token, use_cache=True)
+
+def main():
+    print("=== Access token 驗證微基準測試 ===")
+    user = seed()
+    legacy_token = auth.create_access_token(data={"sub": user.email})
+    claims_token = auth.create_user_access_token(user)
+
+    asyncio.run(run_all(legacy_token, claims_token))
+
+if __name__ == "__main__":
+    main()
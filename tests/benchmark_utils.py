@@ -0,0 +1,90 @@
+"""
+基準測試共用工具
+在同一個 process 內建立應用程式 (不需要啟動伺服器)，並提供計時與統計函式
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+def setup_environment(database_url: str | None = None) -> str:
+    """設定環境變數，必須在匯入 main / models 之前呼叫
+    未指定 database_url 時使用暫存的 SQLite 檔案
+    """
+    if database_url is None:
+        database_url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'bench.db')}"
+    os.environ.setdefault("SECRET_KEY", "benchmark-secret-key")
+    # 基準測試會大量登入，關閉限流
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    # 以正式環境設定量測 (不啟用開發用的 SQL profiler)
+    os.environ.setdefault("ENVIRONMENT", "production")
+    os.environ.setdefault("METRICS_TOKEN", "benchmark-metrics-token")
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    return database_url
+
+def percentile(samples, p):
+    """回傳樣本的第 p 百分位數"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+def summarize(samples):
+    """回傳毫秒為單位的 p50 / p99 / 平均值"""
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 50), 3),
+        "p99_ms": round(percentile(samples, 99), 3),
+        "mean_ms": round(sum(samples) / len(samples), 3) if samples else 0.0,
+    }
+
+def timed_call(func, *args, **kwargs):
+    """執行函式並回傳 (結果, 耗時毫秒)"""
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - start) * 1000
+
+def create_user_and_login(client, email="bench@example.com", password="123456"):
+    """註冊並登入測試用戶，回傳 Authorization header"""
+    client.post("/register", json={"email": email, "password": password, "name": "bench"})
+    response = client.post("/login", json={"email": email, "password": password})
+    return {"Authorization": f"Bearer {response.json()['data']['access_token']}"}
+
+def seed_todos(email: str, count: int, chunk_size: int = 10000) -> list[int]:
+    """直接寫入資料庫，為指定用戶建立 count 筆 todo (同時寫入搜尋索引)，回傳新 todo 的 id"""
+    from sqlalchemy import insert, select
+    from models import engine, Todo, User
+    import search
+
+    with engine.begin() as connection:
+        owner_id = connection.execute(select(User.id).where(User.email == email)).scalar_one()
+        last_id = connection.execute(select(Todo.id).order_by(Todo.id.desc()).limit(1)).scalar() or 0
+        for start in range(0, count, chunk_size):
+            connection.execute(insert(Todo), [
+                {"title": f"todo {i}", "description": f"description of todo {i}", "status": i % 2, "owner_id": owner_id}
+                for i in range(start, min(count, start + chunk_size))
+            ])
+        rows = connection.execute(
+            select(Todo.id, Todo.owner_id, Todo.title, Todo.description)
+            .where(Todo.owner_id == owner_id, Todo.id > last_id).order_by(Todo.id)
+        ).mappings().all()
+        for start in range(0, len(rows), chunk_size):
+            search.index_todos(connection, rows[start:start + chunk_size], replace=False)
+        return [row["id"] for row in rows]
+
+class QueryCounter:
+    """計算 engine 送出的 SQL 數量"""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self.count = 0
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def reset(self):
+        self.count = 0
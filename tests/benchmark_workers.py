@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+多 worker 擴展性測試
+以 gunicorn.conf.py 分別啟動 1 / 2 / 4 個 worker，量測 GET /todos 與 POST /login (bcrypt) 的吞吐量，
+以及登入壓力下 GET /todos 的延遲，觀察吞吐量是否隨 worker 數量增加
+    WORKERS=1,2,4,8 CONCURRENCY=64 DURATION=10 python tests/benchmark_workers.py
+需要安裝 gunicorn 與 httpx；worker 數量超過 CPU 核心數時不會再提升
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from benchmark_utils import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = int(os.getenv("BENCH_PORT", "8766"))
+WORKERS = [int(n) for n in os.getenv("WORKERS", "1,2,4").split(",")]
+CONCURRENCY = int(os.getenv("CONCURRENCY", "64"))
+DURATION = float(os.getenv("DURATION", "10"))
+USER = {"email": "workers@example.com", "password": "123456", "name": "workers"}
+
+def start_server(workers: int, database_url: str) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        SECRET_KEY=os.getenv("SECRET_KEY", "benchmark-secret-key"),
+        DATABASE_URL=database_url,
+        ENVIRONMENT="production",
+        RATE_LIMIT_ENABLED="false",
+        WEB_CONCURRENCY=str(workers),
+        PORT=str(PORT),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "main:app", "-c", "gunicorn.conf.py",
+         "--log-level", "warning", "--backlog", str(CONCURRENCY * 2)],
+        cwd=ROOT, env=env,
+    )
+    for _ in range(200):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/health")
+            return server
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.kill()
+    raise RuntimeError("伺服器啟動失敗")
+
+def prepare(base_url: str) -> dict:
+    """建立測試帳號與 todo，回傳 Authorization header"""
+    httpx.post(f"{base_url}/register", json=USER)
+    token = httpx.post(f"{base_url}/login", json=USER).json()["data"]["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    httpx.post(f"{base_url}/todos", json=[{"title": f"todo {i}"} for i in range(50)], headers=headers)
+    return headers
+
+async def run_load(base_url: str, headers: dict, login_share: float) -> dict:
+    """CONCURRENCY 個連線中 login_share 比例打 POST /login，其餘打 GET /todos"""
+    latencies = {"GET /todos": [], "POST /login": []}
+    errors = 0
+    deadline = time.perf_counter() + DURATION
+    login_workers = round(CONCURRENCY * login_share)
+    limits = httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        async def worker(is_login: bool):
+            nonlocal errors
+            name = "POST /login" if is_login else "GET /todos"
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    if is_login:
+                        response = await client.post("/login", json=USER)
+                    else:
+                        response = await client.get("/todos", headers=headers)
+                    if response.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies[name].append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(i < login_workers) for i in range(CONCURRENCY)))
+        elapsed = time.perf_counter() - start
+
+    return {
+        name: {
+            "rps": len(samples) / elapsed,
+            "p50": percentile(samples, 50),
+            "p99": percentile(samples, 99),
+        }
+        for name, samples in latencies.items() if samples
+    } | {"errors": errors}
+
+def benchmark(workers: int) -> dict:
+    database_url = os.getenv("BENCH_DATABASE_URL") or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'workers.db')}"
+    server = start_server(workers, database_url)
+    try:
+        base_url = f"http://127.0.0.1:{PORT}"
+        headers = prepare(base_url)
+        return {
+            "GET /todos": asyncio.run(run_load(base_url, headers, login_share=0)),
+            "POST /login": asyncio.run(run_load(base_url, headers, login_share=1)),
+            # 1/4 連線持續登入時，其他請求受影響的程度
+            "mixed": asyncio.run(run_load(base_url, headers, login_share=0.25)),
+        }
+    finally:
+        server.terminate()
+        server.wait()
+
+def main():
+    print(f"=== 多 worker 擴展性測試 (CPU {os.cpu_count()} 核心, {CONCURRENCY} 連線, 每項 {DURATION:.0f}s) ===")
+    baseline = {}
+    for workers in WORKERS:
+        results = benchmark(workers)
+        for scenario, stats in results.items():
+            for name, endpoint in stats.items():
+                if name == "errors":
+                    continue
+                key = (scenario, name)
+                baseline.setdefault(key, endpoint["rps"])
+                speedup = endpoint["rps"] / baseline[key] if baseline[key] else 0.0
+                print(f"workers={workers:<3} {scenario:<12} {name:<12} {endpoint['rps']:8.1f} req/s (x{speedup:4.2f})  "
+                      f"p50={endpoint['p50']:8.1f}ms  p99={endpoint['p99']:8.1f}ms  錯誤={stats['errors']}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""
+SQL 查詢數量檢查工具
+依賴開發環境的 SQL profiler (environment=development) 回傳的 X-DB-Query-Count / X-SQL-Profile-Id header，
+讓測試可以限制每個 API 的查詢數量，查詢數變多 (例如出現 N+1) 時測試失敗
+"""
+
+def query_count(response) -> int:
+    """回應中記錄的 SQL 數量"""
+    value = response.headers.get("x-db-query-count")
+    if value is None:
+        raise AssertionError("回應沒有 X-DB-Query-Count header，請確認 ENVIRONMENT=development 且 SQL profiler 已啟用")
+    return int(value)
+
+def get_profile(client, response) -> dict:
+    """取得該回應的完整 SQL 紀錄"""
+    profile_id = response.headers["x-sql-profile-id"]
+    return client.get("/debug/sql-profiles", params={"profile_id": profile_id}).json()[0]
+
+def format_queries(profile: dict) -> str:
+    return "\n".join(f"  {query['ms']:8.3f}ms  {query['sql']}" for query in profile["queries"])
+
+def assert_max_queries(client, response, budget: int):
+    """確認請求送出的 SQL 不超過 budget 筆"""
+    count = query_count(response)
+    if count > budget:
+        profile = get_profile(client, response)
+        raise AssertionError(
+            f"{profile['method']} {profile['path']} 送出 {count} 筆 SQL，超過上限 {budget}:\n{format_queries(profile)}"
+        )
+
+def assert_no_repeated_queries(client, response):
+    """確認沒有同一種 SQL 重複執行 (N+1)"""
+    profile = get_profile(client, response)
+    if profile["repeated"]:
+        raise AssertionError(
+            f"{profile['method']} {profile['path']} 有重複的 SQL: {profile['repeated']}\n{format_queries(profile)}"
+        )
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Access token 驗證測試：舊版 (只有 sub) token 的接受與拒絕、密碼重設後舊 token 失效，
+密碼重設 token 只能使用一次 (包含同時使用)，以及 bcrypt 佇列已滿時回 503
+    python -m pytest tests/test_auth.py
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+# 必須在匯入應用程式模組之前設定 (同一個 pytest process 中已匯入時沿用既有設定，每個測試使用新的用戶)
+os.environ.setdefault("SECRET_KEY", "auth-test-key")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'auth.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+import auth
+import migrations
+from cache import TTLCache
+from config import settings
+from main import app
+from models import SessionLocal
+
+# TestClient 未進入 with 區塊時不會執行 lifespan，先建立資料表
+migrations.upgrade()
+client = TestClient(app)
+PASSWORD = "123456"
+
+@pytest.fixture
+def user(monkeypatch) -> dict:
+    """註冊一位新用戶，並使用空的用戶快取"""
+    monkeypatch.setattr(settings, "rate_limit_enabled", False)
+    monkeypatch.setattr(auth, "_user_cache", TTLCache(maxsize=100, ttl=settings.user_cache_ttl))
+    user = {"email": f"{uuid.uuid4().hex}@example.com", "password": PASSWORD, "name": "auth"}
+    response = client.post("/register", json=user)
+    assert response.status_code == 200, response.text
+    return {**user, "id": response.json()["data"]["id"]}
+
+def login(user: dict, password: str = PASSWORD) -> str:
+    response = client.post("/login", json={"email": user["email"], "password": password})
+    assert response.status_code == 200, response.text
+    return response.json()["data"]["access_token"]
+
+def todos_status(token: str) -> int:
+    return client.get("/todos", headers={"Authorization": f"Bearer {token}"}).status_code
+
+def reset_password(user: dict, new_password: str) -> int:
+    db = SessionLocal()
+    try:
+        token = auth.create_password_reset_token(user["email"], db)
+    finally:
+        db.close()
+    return client.post("/reset-password", json={"token": token, "new_password": new_password}).status_code
+
+def test_legacy_token_accepted_during_transition(user, monkeypatch):
+    monkeypatch.setattr(settings, "accept_legacy_tokens", True)
+    assert todos_status(auth.create_access_token({"sub": user["email"]})) == 200
+
+def test_legacy_token_rejected_after_transition(user, monkeypatch):
+    monkeypatch.setattr(settings, "accept_legacy_tokens", False)
+    assert todos_status(auth.create_access_token({"sub": user["email"]})) == 401
+    # 新版 token 不受影響
+    assert todos_status(login(user)) == 200
+
+def test_token_without_identity_rejected(user):
+    assert todos_status(auth.create_access_token({"name": "nobody"})) == 401
+    assert todos_status(auth.create_access_token({"sub": user["email"]}, expires_delta=timedelta(seconds=-1))) == 401
+
+def test_reset_password_revokes_old_tokens(user):
+    token = login(user)
+    assert todos_status(token) == 200
+    assert reset_password(user, "654321") == 200
+    assert todos_status(token) == 401
+    assert todos_status(login(user, "654321")) == 200
+
+def test_other_workers_revoke_within_cache_ttl(user, monkeypatch):
+    """其他 worker 的快取不會被清除：舊 token 最多在 user_cache_ttl 秒內仍有效"""
+    monkeypatch.setattr(auth, "_user_cache", TTLCache(maxsize=100, ttl=0.2))
+    token = login(user)
+    assert todos_status(token) == 200
+    stale = auth._user_cache.get(token)
+    assert reset_password(user, "654321") == 200
+    # 模擬另一個 worker：仍保有重設前快取的用戶
+    auth._user_cache.set(token, stale)
+    assert todos_status(token) == 200
+    time.sleep(0.3)
+    assert todos_status(token) == 401
+
+def test_reset_token_is_single_use(user):
+    db = SessionLocal()
+    try:
+        token = auth.create_password_reset_token(user["email"], db)
+    finally:
+        db.close()
+    assert client.post("/reset-password", json={"token": token, "new_password": "654321"}).status_code == 200
+    response = client.post("/reset-password", json={"token": token, "new_password": "111111"})
+    assert response.status_code == 400
+    # 第二次使用沒有改動密碼
+    assert client.post("/login", json={"email": user["email"], "password": "111111"}).status_code == 400
+    assert login(user, "654321")
+
+def test_reset_token_single_use_under_concurrency(user):
+    """同一個 token 同時被使用時只有一個請求成功"""
+    import crud
+    from concurrent.futures import ThreadPoolExecutor
+    from fastapi import HTTPException
+
+    db = SessionLocal()
+    try:
+        token = auth.create_password_reset_token(user["email"], db)
+    finally:
+        db.close()
+
+    def attempt(password_hash: str) -> bool:
+        session = SessionLocal()
+        try:
+            crud.reset_user_password(session, token, password_hash)
+            return True
+        except HTTPException as error:
+            assert error.status_code == 400
+            return False
+        finally:
+            session.close()
+
+    hashes = [auth.get_password_hash(f"pass{i:02d}") for i in range(4)]
+    with ThreadPoolExecutor(len(hashes)) as executor:
+        results = list(executor.map(attempt, hashes))
+    assert results.count(True) == 1
+    winner = f"pass{results.index(True):02d}"
+    assert login(user, winner)
+    assert all(
+        client.post("/login", json={"email": user["email"], "password": f"pass{i:02d}"}).status_code == 400
+        for i in range(len(hashes)) if not results[i]
+    )
+
+def test_hash_queue_full_returns_503(user, monkeypatch):
+    """bcrypt 佇列已滿時登入與註冊都直接回 503 與 Retry-After，不排隊等待"""
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(auth, "_hash_slots", slots)
+    slots.acquire()
+    response = client.post("/login", json={"email": user["email"], "password": PASSWORD})
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+    other = {"email": f"{uuid.uuid4().hex}@example.com", "password": PASSWORD, "name": "auth"}
+    response = client.post("/register", json=other)
+    assert response.status_code == 503 and response.headers["Retry-After"] == "1"
+
+    # 空出位置後恢復正常，且請求結束時會歸還位置
+    slots.release()
+    assert login(user)
+    assert slots.acquire(blocking=False)
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+背景寄信佇列測試
+使用 aiosmtpd 在本機啟動一個假的 SMTP 伺服器，不需要真實的郵件帳號
+需要安裝: pip install aiosmtpd
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+# 必須在匯入應用程式模組之前設定
+os.environ.setdefault("SECRET_KEY", "mail-queue-test-key")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'mail.db')}"
+os.environ["SMTP_SERVER"] = "127.0.0.1"
+os.environ["SMTP_PORT"] = os.getenv("TEST_SMTP_PORT", "8025")
+os.environ["SMTP_USERNAME"] = "tester"
+os.environ["SMTP_PASSWORD"] = "secret"
+os.environ["SMTP_STARTTLS"] = "false"
+os.environ["MAIL_RETRY_BASE_SECONDS"] = "0"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import delete, update
+
+from config import settings
+from metrics import mail_dead_letters_total
+from models import Base, engine, SessionLocal, OutboundMail
+from mailer import MailDispatcher, queue_mail
+from sweeper import DeadMailSweeper
+
+@pytest.fixture(autouse=True)
+def mail_settings(monkeypatch):
+    """同一個 pytest process 中其他測試已先匯入 config 時，上面的環境變數不會生效，直接設定 settings；
+    每個測試開始時清空佇列 (可能與其他測試共用資料庫)
+    """
+    monkeypatch.setattr(settings, "smtp_server", os.environ["SMTP_SERVER"])
+    monkeypatch.setattr(settings, "smtp_port", int(os.environ["SMTP_PORT"]))
+    monkeypatch.setattr(settings, "smtp_username", "tester")
+    monkeypatch.setattr(settings, "smtp_password", "secret")
+    monkeypatch.setattr(settings, "smtp_starttls", False)
+    monkeypatch.setattr(settings, "mail_retry_base_seconds", 0)
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.execute(delete(OutboundMail))
+    db.commit()
+    db.close()
+
+class RecordingHandler:
+    """記錄收到的郵件"""
+
+    def __init__(self):
+        self.messages = []
+        self.connections = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.connections += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.messages.append((envelope.rcpt_tos, envelope.content))
+        return "250 OK"
+
+def accept_any_login(server, session, envelope, mechanism, auth_data):
+    return AuthResult(success=True)
+
+def start_smtp_server(handler):
+    controller = Controller(
+        handler, hostname="127.0.0.1", port=int(os.environ["SMTP_PORT"]),
+        authenticator=accept_any_login, auth_require_tls=False,
+    )
+    controller.start()
+    return controller
+
+def queue(count):
+    db = SessionLocal()
+    for i in range(count):
+        queue_mail(db, f"user{i}@example.com", "測試郵件", f"內容 {i}")
+    db.commit()
+    db.close()
+
+def pending_count():
+    db = SessionLocal()
+    count = db.query(OutboundMail).count()
+    db.close()
+    return count
+
+def test_queue_sends_batch_over_one_connection():
+    """佇列中的郵件應該全部寄出、刪除，且共用同一條 SMTP 連線"""
+    print("=== 測試批次寄送 ===")
+    Base.metadata.create_all(bind=engine)
+    handler = RecordingHandler()
+    controller = start_smtp_server(handler)
+    try:
+        queue(5)
+        dispatcher = MailDispatcher()
+        while dispatcher.dispatch_batch():
+            pass
+        dispatcher._close_transport()
+
+        assert len(handler.messages) == 5, handler.messages
+        assert handler.connections == 1, handler.connections
+        assert pending_count() == 0
+        print("✅ 5 封郵件經由同一條連線寄出")
+    finally:
+        controller.stop()
+
+def test_failed_mail_is_kept_for_retry():
+    """SMTP 伺服器無法連線時，郵件應保留在佇列並記錄重試次數"""
+    print("\n=== 測試寄送失敗重試 ===")
+    Base.metadata.create_all(bind=engine)
+    queue(1)
+    dispatcher = MailDispatcher()
+    dispatcher.dispatch_batch()
+
+    db = SessionLocal()
+    mail = db.query(OutboundMail).one()
+    db.close()
+    assert mail.attempts == 1 and mail.last_error, mail.last_error
+    print(f"✅ 失敗的郵件保留在佇列中 (attempts={mail.attempts})")
+
+    # 伺服器恢復後由背景 thread 重試成功
+    handler = RecordingHandler()
+    controller = start_smtp_server(handler)
+    try:
+        dispatcher.start()
+        dispatcher.wake()
+        deadline = time.time() + 5
+        while pending_count() and time.time() < deadline:
+            time.sleep(0.1)
+        dispatcher.stop()
+        assert pending_count() == 0
+        assert len(handler.messages) == 1
+        print("✅ 伺服器恢復後重試成功")
+    finally:
+        controller.stop()
+
+def test_mail_is_dead_lettered_after_max_attempts():
+    """最後一次重試失敗後不再取出，計入 mail_dead_letters_total，超過保留期限後由 sweeper 刪除"""
+    print("\n=== 測試不再重試的郵件 ===")
+    Base.metadata.create_all(bind=engine)
+    queue(1)
+    db = SessionLocal()
+    db.execute(update(OutboundMail).values(attempts=settings.mail_max_attempts - 1))
+    db.commit()
+
+    dead_before = mail_dead_letters_total._values.get((), 0)
+    dispatcher = MailDispatcher()
+    assert dispatcher.dispatch_batch() == 1
+    assert dispatcher.dispatch_batch() == 0
+    assert mail_dead_letters_total._values.get((), 0) == dead_before + 1
+    mail = db.query(OutboundMail).one()
+    assert mail.attempts == settings.mail_max_attempts
+    # 內文可能含有密碼重設連結，不再重試時清空
+    assert mail.body == "" and mail.last_error
+    print(f"✅ 失敗 {mail.attempts} 次後不再重試")
+
+    sweeper = DeadMailSweeper()
+    assert sweeper.sweep() == 0
+    db.execute(update(OutboundMail).values(
+        next_attempt_at=datetime.utcnow() - timedelta(days=settings.mail_dead_letter_retention_days + 1)
+    ))
+    db.commit()
+    db.close()
+    assert sweeper.sweep() == 1
+    assert pending_count() == 0
+    print("✅ 超過保留期限後刪除")
+
+if __name__ == "__main__":
+    test_queue_sends_batch_over_one_connection()
+    test_failed_mail_is_kept_for_retry()
+    test_mail_is_dead_lettered_after_max_attempts()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+監控指標路由的存取控制，以及 SQL 計時 hook 不重複安裝
+    python -m pytest tests/test_metrics.py
+"""
+
+import os
+import sys
+import tempfile
+
+# 必須在匯入應用程式模組之前設定 (同一個 pytest process 中已匯入時沿用既有設定)
+os.environ.setdefault("SECRET_KEY", "metrics-test-key")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'metrics.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi.testclient import TestClient
+
+from config import settings
+from main import app
+
+client = TestClient(app)
+ROUTES = ("/metrics", "/metrics/pool", "/metrics/reset-tokens")
+
+@pytest.mark.parametrize("route", ROUTES)
+def test_production_without_token_is_hidden(monkeypatch, route):
+    monkeypatch.setattr(settings, "environment", "production")
+    monkeypatch.setattr(settings, "metrics_token", "")
+    assert client.get(route).status_code == 404
+
+@pytest.mark.parametrize("route", ROUTES)
+def test_token_required(monkeypatch, route):
+    monkeypatch.setattr(settings, "environment", "production")
+    monkeypatch.setattr(settings, "metrics_token", "scrape-secret")
+    response = client.get(route)
+    assert response.status_code == 401 and response.headers["WWW-Authenticate"] == "Bearer"
+    assert client.get(route, headers={"Authorization": "Bearer wrong"}).status_code == 401
+    assert client.get(route, headers={"Authorization": "Bearer scrape-secret"}).status_code == 200
+
+def test_open_in_development_without_token(monkeypatch):
+    monkeypatch.setattr(settings, "environment", "development")
+    monkeypatch.setattr(settings, "metrics_token", "")
+    response = client.get("/metrics")
+    assert response.status_code == 200 and "http_requests_total" in response.text
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(settings, "metrics_enabled", False)
+    monkeypatch.setattr(settings, "metrics_token", "scrape-secret")
+    assert client.get("/metrics", headers={"Authorization": "Bearer scrape-secret"}).status_code == 404
+
+def test_one_cursor_hook_per_engine():
+    """指標與 SQL profiler 共用同一組 cursor 計時 hook"""
+    from models import sync_engines
+
+    for target in sync_engines():
+        assert len(target.dispatch.before_cursor_execute) == 1
+        assert len(target.dispatch.after_cursor_execute) == 1
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+schema migration 測試
+新資料庫、舊版 (create_all 時期) 資料庫都能升級到最新版本，缺少索引時 check_schema 會回報
+可執行: python -m pytest tests/test_migrations.py
+"""
+
+import os
+import sys
+import tempfile
+
+os.environ.setdefault("SECRET_KEY", "migrations-test-key")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, inspect, text
+
+import migrations
+
+def temp_engine():
+    return create_engine(f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'migrations.db')}")
+
+def test_fresh_database_is_migrated_to_latest():
+    engine = temp_engine()
+    assert migrations.upgrade(engine) == [name for _, name, _, _ in migrations.MIGRATIONS]
+    assert migrations.check_schema(engine) == []
+    # 已是最新版本時不再執行任何 migration
+    assert migrations.upgrade(engine) == []
+
+def test_legacy_database_gets_columns_and_indexes():
+    engine = temp_engine()
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE users (id INTEGER PRIMARY KEY, email VARCHAR NOT NULL, "
+                          "hashed_password VARCHAR NOT NULL, name VARCHAR NOT NULL)"))
+        conn.execute(text("CREATE TABLE todos (id INTEGER PRIMARY KEY, title VARCHAR NOT NULL, "
+                          "description VARCHAR, status INTEGER, owner_id INTEGER REFERENCES users(id))"))
+        conn.execute(text("INSERT INTO users VALUES (1, 'old@example.com', 'x', 'old')"))
+        conn.execute(text("INSERT INTO todos VALUES (1, 'buy milk', NULL, 0, 1)"))
+    assert "缺少索引 ix_todos_owner_id_id (todos)" in migrations.check_schema(engine)
+
+    migrations.upgrade(engine)
+
+    assert migrations.check_schema(engine) == []
+    inspector = inspect(engine)
+    assert {"token_version", "todos_version"} <= {c["name"] for c in inspector.get_columns("users")}
+    assert {"updated_at", "deleted_at", "version"} <= {c["name"] for c in inspector.get_columns("todos")}
+    # 既有的 todo 已寫入搜尋索引
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT rowid FROM todos_fts")).scalars().all() == [1]
+
+def test_check_reports_dropped_index():
+    engine = temp_engine()
+    migrations.upgrade(engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_todos_owner_status_id"))
+    assert migrations.check_schema(engine) == ["缺少索引 ix_todos_owner_status_id (todos)"]
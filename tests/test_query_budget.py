@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+各 API 的 SQL 數量上限測試
+查詢數量超過上限或出現 N+1 時測試失敗，可在 CI 中執行: python -m pytest tests/test_query_budget.py
+"""
+
+import os
+import sys
+import tempfile
+
+# 必須在匯入應用程式模組之前設定
+os.environ.setdefault("SECRET_KEY", "query-budget-test-key")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'budget.db')}"
+os.environ["ENVIRONMENT"] = "development"
+os.environ["RATE_LIMIT_ENABLED"] = "false"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+
+from main import app
+import migrations
+from query_budget import assert_max_queries, assert_no_repeated_queries
+
+# TestClient 未進入 with 區塊時不會執行 lifespan，先建立資料表
+migrations.upgrade()
+client = TestClient(app)
+USER = {"email": "budget@example.com", "password": "123456", "name": "budget"}
+
+def login() -> dict:
+    client.post("/register", json=USER)
+    response = client.post("/login", json={"email": USER["email"], "password": USER["password"]})
+    return {"Authorization": f"Bearer {response.json()['data']['access_token']}"}
+
+HEADERS = login()
+
+def create(n: int) -> list[int]:
+    response = client.post("/todos", json=[{"title": f"todo {i}"} for i in range(n)], headers=HEADERS)
+    assert response.status_code == 200
+    return [todo["id"] for todo in response.json()["data"]]
+
+def test_create_todos_does_not_grow_with_batch_size():
+    response = client.post("/todos", json=[{"title": f"todo {i}"} for i in range(200)], headers=HEADERS)
+    assert response.status_code == 200
+    # 驗證用戶、遞增版本號、INSERT、寫入搜尋索引
+    assert_max_queries(client, response, 4)
+    assert_no_repeated_queries(client, response)
+
+def test_list_todos():
+    create(50)
+    response = client.get("/todos", headers=HEADERS)
+    assert response.status_code == 200
+    assert_max_queries(client, response, 2)
+
+def test_update_todos_does_not_grow_with_batch_size():
+    ids = create(100)
+    response = client.put("/todos", json=[{"id": todo_id, "title": "updated"} for todo_id in ids], headers=HEADERS)
+    assert response.status_code == 200
+    # 查詢 todo、遞增版本號、UPDATE、更新搜尋索引 (刪除 + 寫入)
+    assert_max_queries(client, response, 5)
+    assert_no_repeated_queries(client, response)
+
+def test_update_deleted_todo_is_not_found():
+    ids = create(2)
+    assert client.delete("/todos", params={"ids": ids[1:]}, headers=HEADERS).status_code == 200
+    etag = client.get("/todos", headers=HEADERS).headers["ETag"]
+    response = client.put("/todos", json=[{"id": todo_id, "title": "updated"} for todo_id in ids], headers=HEADERS)
+    assert response.status_code == 404
+    # 版本號的遞增已撤銷，tombstone 沒有被改寫
+    assert client.get("/todos", headers={**HEADERS, "If-None-Match": etag}).status_code == 304
+
+def test_batch_status_and_delete():
+    ids = create(20)
+    response = client.patch("/todos/status", params={"ids": ids}, json={"status": 1}, headers=HEADERS)
+    assert response.status_code == 200
+    assert_max_queries(client, response, 2)
+
+    response = client.delete("/todos", params={"ids": ids}, headers=HEADERS)
+    assert response.status_code == 200
+    # 遞增版本號、標記刪除、移除搜尋索引
+    assert_max_queries(client, response, 3)
+
+if __name__ == "__main__":
+    for name, test in list(globals().items()):
+        if name.startswith("test_"):
+            test()
+            print(f"{name} 通過")
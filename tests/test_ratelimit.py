@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+限流測試：token bucket 的容量與補充、429 與 Retry-After、依帳號限流、規則格式檢查，
+以及信任 X-Forwarded-For 時只採用受信任代理附加的位址
+    python -m pytest tests/test_ratelimit.py
+"""
+
+import os
+import sys
+import tempfile
+
+# 必須在匯入應用程式模組之前設定 (同一個 pytest process 中已匯入時沿用既有設定)
+os.environ.setdefault("SECRET_KEY", "ratelimit-test-key")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'ratelimit.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+from fastapi import HTTPException
+from pydantic import ValidationError
+from starlette.requests import Request
+
+import ratelimit
+from config import Settings, settings
+from ratelimit import MemoryBackend, client_ip, limit_by_user, parse_rule
+
+class FakeClock:
+    """取代 ratelimit 模組中的 time，讓測試控制時間"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    fake = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", fake)
+    return fake
+
+@pytest.fixture
+def backend(monkeypatch) -> MemoryBackend:
+    """每個測試使用新的 bucket，並開啟限流"""
+    fresh = MemoryBackend()
+    monkeypatch.setattr(ratelimit, "_backend", fresh)
+    monkeypatch.setattr(settings, "rate_limit_enabled", True)
+    return fresh
+
+def test_bucket_capacity(clock):
+    backend = MemoryBackend()
+    capacity, refill_rate = parse_rule("3/minute")
+    assert [backend.acquire("k", capacity, refill_rate) for _ in range(3)] == [0, 0, 0]
+    # 每 20 秒補充一個 token
+    assert backend.acquire("k", capacity, refill_rate) == pytest.approx(20)
+
+def test_bucket_refills_over_time(clock):
+    backend = MemoryBackend()
+    capacity, refill_rate = parse_rule("3/minute")
+    for _ in range(3):
+        backend.acquire("k", capacity, refill_rate)
+    clock.now += 10
+    assert backend.acquire("k", capacity, refill_rate) == pytest.approx(10)
+    clock.now += 10
+    assert backend.acquire("k", capacity, refill_rate) == 0
+    # 閒置再久也不會超過容量
+    clock.now += 3600
+    assert [backend.acquire("k", capacity, refill_rate) for _ in range(4)][-1] == pytest.approx(20)
+
+def test_login_returns_429_with_retry_after(backend, monkeypatch):
+    from fastapi.testclient import TestClient
+    from main import app
+    import migrations
+
+    migrations.upgrade()
+    monkeypatch.setattr(settings, "rate_limit_login_ip", "100/minute")
+    monkeypatch.setattr(settings, "rate_limit_login_user", "2/minute")
+    client = TestClient(app)
+    body = {"email": "nobody@example.com", "password": "123456"}
+    assert [client.post("/login", json=body).status_code for _ in range(2)] == [400, 400]
+    response = client.post("/login", json=body)
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["Retry-After"]) <= 30
+
+def test_limit_by_user_keys_per_account(backend, clock, monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_login_user", "2/minute")
+    for _ in range(2):
+        limit_by_user("login", "alice@example.com", "rate_limit_login_user")
+    # email 不分大小寫，視為同一個帳號
+    with pytest.raises(HTTPException) as error:
+        limit_by_user("login", "Alice@Example.com", "rate_limit_login_user")
+    assert error.value.status_code == 429 and error.value.headers["Retry-After"] == "30"
+    # 其他帳號與其他動作不受影響
+    limit_by_user("login", "bob@example.com", "rate_limit_login_user")
+    limit_by_user("forgot-password", "alice@example.com", "rate_limit_login_user")
+
+@pytest.mark.parametrize("rule", ["5/minute", "10/minutes", " 3 / hour ", "1/second", ""])
+def test_valid_rules(rule):
+    assert Settings(secret_key="x", rate_limit_login_ip=rule).rate_limit_login_ip == rule
+
+@pytest.mark.parametrize("rule", ["5/fortnight", "five/minute", "0/minute", "-1/minute", "5", "/minute"])
+def test_invalid_rules_rejected_at_startup(rule):
+    with pytest.raises(ValidationError):
+        Settings(secret_key="x", rate_limit_login_ip=rule)
+
+def request(*forwarded_for: str, peer: str = "10.0.0.1") -> Request:
+    headers = [(b"x-forwarded-for", value.encode()) for value in forwarded_for]
+    return Request({"type": "http", "headers": headers, "client": (peer, 12345)})
+
+def test_forwarded_for_ignored_unless_trusted(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_trust_forwarded_for", False)
+    assert client_ip(request("203.0.113.9")) == "10.0.0.1"
+
+def test_uses_address_appended_by_trusted_proxy(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_trust_forwarded_for", True)
+    monkeypatch.setattr(settings, "rate_limit_trusted_proxy_count", 1)
+    assert client_ip(request("203.0.113.9")) == "203.0.113.9"
+    # 用戶端偽造的位址在左邊，代理附加的真實位址在最右邊
+    assert client_ip(request("1.2.3.4, 203.0.113.9")) == "203.0.113.9"
+    # 多個 header 依順序合併
+    assert client_ip(request("1.2.3.4", "203.0.113.9")) == "203.0.113.9"
+    # 沒有 header 時使用實際連線的位址
+    assert client_ip(request()) == "10.0.0.1"
+
+def test_multiple_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_trust_forwarded_for", True)
+    monkeypatch.setattr(settings, "rate_limit_trusted_proxy_count", 2)
+    assert client_ip(request("1.2.3.4, 203.0.113.9, 198.51.100.7")) == "203.0.113.9"
+    # 位址數量少於代理層數：header 不可信，改用實際連線的位址
+    assert client_ip(request("203.0.113.9")) == "10.0.0.1"
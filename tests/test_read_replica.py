@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+唯讀副本路由測試
+以兩個 SQLite 檔案模擬主資料庫與唯讀副本 (不會自動同步)：
+寫入走主資料庫、寫入後短時間內的讀取仍走主資料庫，之後的讀取改走副本；
+最後一次寫入的時間由用戶端 (cookie) 帶著，以兩個 TestClient 模擬請求被分配到不同的 worker
+    python tests/test_read_replica.py
+    python -m pytest tests/test_read_replica.py
+設定需在匯入應用程式之前完成，pytest 下以子行程執行
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WINDOW = 0.5
+
+def run_scenario(primary_path: str, replica_path: str):
+    from fastapi.testclient import TestClient
+
+    import main
+    import migrations
+    from models import engine, read_engine, has_read_replica
+
+    assert has_read_replica
+    migrations.upgrade(engine)
+    migrations.upgrade(read_engine)
+    # 正式環境的 cookie 帶有 Secure，需以 https 送出
+    client = TestClient(main.app, base_url="https://testserver")
+
+    user = {"email": "replica@example.com", "password": "123456", "name": "replica"}
+    assert client.post("/register", json=user).status_code == 200
+    token = client.post("/login", json={"email": user["email"], "password": user["password"]}).json()["data"]["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    def titles():
+        response = client.get("/todos", headers=headers)
+        assert response.status_code == 200, response.text
+        return [todo["title"] for todo in response.json()["data"]]
+
+    # 副本上還沒有這個用戶：驗證 token 時改查主資料庫，列表則讀副本
+    assert titles() == []
+
+    assert client.post("/todos", json=[{"title": "buy milk"}], headers=headers).status_code == 200
+    # 剛寫入：讀取走主資料庫，讀得到自己的修改
+    assert titles() == ["buy milk"]
+
+    # 超過 read-your-writes 期間：改讀副本 (尚未同步)
+    time.sleep(WINDOW * 2)
+    assert titles() == []
+
+    # 模擬副本同步完成
+    read_engine.dispose()
+    with sqlite3.connect(primary_path) as source, sqlite3.connect(replica_path) as target:
+        source.backup(target)
+    assert titles() == ["buy milk"]
+    assert client.get("/todos/search", params={"q": "milk"}, headers=headers).json()["data"][0]["title"] == "buy milk"
+
+    # 兩個 worker：寫入由 worker 1 處理，接著的讀取分配到 worker 2，
+    # worker 之間不共用記憶體，read-your-writes 只能依靠用戶端帶來的 cookie
+    worker_1 = TestClient(main.app, base_url="https://testserver")
+    worker_2 = TestClient(main.app, base_url="https://testserver")
+
+    def worker_titles(worker, cookies=None):
+        worker.cookies.clear()
+        worker.cookies.update(cookies or {})
+        response = worker.get("/todos", headers=headers)
+        assert response.status_code == 200, response.text
+        return [todo["title"] for todo in response.json()["data"]]
+
+    etag = worker_2.get("/todos", headers=headers).headers["ETag"]
+    response = worker_1.post("/todos", json=[{"title": "walk dog"}], headers=headers)
+    assert response.status_code == 200
+    assert "last_write" in response.cookies and response.headers["X-Last-Write"]
+    cookies = dict(response.cookies)
+    assert worker_titles(worker_2, cookies) == ["buy milk", "walk dog"]
+    # 沒有 cookie 時改以 X-Last-Write header 轉送
+    worker_2.cookies.clear()
+    response = worker_2.get("/todos", headers={**headers, "X-Last-Write": response.headers["X-Last-Write"]})
+    assert [todo["title"] for todo in response.json()["data"]] == ["buy milk", "walk dog"]
+    # 帶著舊的 ETag 輪詢時不會因為副本落後而回 304
+    worker_2.cookies.update(cookies)
+    assert worker_2.get("/todos", headers={**headers, "If-None-Match": etag}).status_code == 200
+    # 沒有寫入紀錄的用戶端 (例如另一台裝置) 照常讀副本
+    assert worker_titles(worker_2) == ["buy milk"]
+    print("✅ 寫入走主資料庫，讀取在 read-your-writes 期間後改走副本，且不依賴 worker 的記憶體")
+
+def test_reads_follow_writes_then_replica():
+    result = subprocess.run([sys.executable, os.path.abspath(__file__)], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+if __name__ == "__main__":
+    directory = tempfile.mkdtemp()
+    primary = os.path.join(directory, "primary.db")
+    replica = os.path.join(directory, "replica.db")
+    os.environ.update({
+        "SECRET_KEY": "read-replica-test-key",
+        "DATABASE_URL": f"sqlite:///{primary}",
+        "READ_DATABASE_URL": f"sqlite:///{replica}",
+        "READ_YOUR_WRITES_SECONDS": str(WINDOW),
+        "RATE_LIMIT_ENABLED": "false",
+        "ENVIRONMENT": "production",
+    })
+    sys.path.insert(0, ROOT)
+    run_scenario(primary, replica)
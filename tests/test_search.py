@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Todo 搜尋測試
+確認依相關度排序 (標題符合排在描述符合之前)、最後一個英數字關鍵字以前綴比對，
+以及用戶只搜尋得到自己的 todo
+    python tests/test_search.py
+    python -m pytest tests/test_search.py
+設定需在匯入應用程式之前完成，pytest 下以子行程執行
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def run_scenario():
+    from fastapi.testclient import TestClient
+
+    import main
+    import migrations
+
+    # TestClient 未進入 with 區塊時不會執行 lifespan，先建立資料表
+    migrations.upgrade()
+    client = TestClient(main.app)
+
+    def login(email: str) -> dict:
+        user = {"email": email, "password": "123456", "name": email.split("@")[0]}
+        assert client.post("/register", json=user).status_code == 200
+        response = client.post("/login", json={"email": email, "password": user["password"]})
+        return {"Authorization": f"Bearer {response.json()['data']['access_token']}"}
+
+    def search(headers: dict, q: str) -> list[str]:
+        response = client.get("/todos/search", params={"q": q}, headers=headers)
+        assert response.status_code == 200, response.text
+        return [todo["title"] for todo in response.json()["data"]]
+
+    alice = login("alice@example.com")
+    bob = login("bob@example.com")
+    response = client.post("/todos", json=[
+        {"title": "call mom", "description": "ask about the milk recipe"},
+        {"title": "buy milk", "description": "two bottles"},
+        {"title": "買牛奶", "description": "全脂"},
+    ], headers=alice)
+    assert response.status_code == 200, response.text
+
+    # 標題符合的排在描述符合之前
+    assert search(alice, "milk") == ["buy milk", "call mom"]
+    # 最後一個關鍵字可只輸入開頭；所有關鍵字都需符合
+    assert search(alice, "bu") == ["buy milk"]
+    assert search(alice, "buy mi") == ["buy milk"]
+    assert search(alice, "milk bottle") == ["buy milk"]
+    assert search(alice, "milk cheese") == []
+    assert search(alice, "牛奶") == ["買牛奶"]
+
+    # 其他用戶搜尋不到
+    assert search(bob, "milk") == []
+    assert search(bob, "牛奶") == []
+    client.post("/todos", json=[{"title": "milk the cow"}], headers=bob)
+    assert search(bob, "milk") == ["milk the cow"]
+    assert "milk the cow" not in search(alice, "milk")
+    print("✅ 搜尋依相關度排序、支援前綴比對，且只回傳自己的 todo")
+
+def test_search_ranking_prefix_and_isolation():
+    result = subprocess.run([sys.executable, os.path.abspath(__file__)], cwd=ROOT, capture_output=True, text=True)
+    assert result.returncode == 0, result.stdout + result.stderr
+
+if __name__ == "__main__":
+    os.environ.update({
+        "SECRET_KEY": "search-test-key",
+        "DATABASE_URL": f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'search.db')}",
+        "RATE_LIMIT_ENABLED": "false",
+        "ENVIRONMENT": "production",
+    })
+    sys.path.insert(0, ROOT)
+    run_scenario()
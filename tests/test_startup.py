@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+冷啟動測試
+量測 import main 的時間，以及啟動 uvicorn 到第一個 200 回應 (GET /health/ready，需連上資料庫) 的時間，
+並確認匯入時不會載入寄信模組、也不會連線資料庫
+    python tests/test_startup.py                 印出 RUNS 次的中位數
+    python -m pytest tests/test_startup.py       超過 STARTUP_IMPORT_BUDGET / STARTUP_READY_BUDGET 秒時失敗
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = int(os.getenv("BENCH_PORT", "8767"))
+RUNS = int(os.getenv("RUNS", "5"))
+IMPORT_BUDGET = float(os.getenv("STARTUP_IMPORT_BUDGET", "3"))
+READY_BUDGET = float(os.getenv("STARTUP_READY_BUDGET", "6"))
+
+# 匯入 main 後回報耗時與已載入的模組
+IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import main
+print(json.dumps({"seconds": time.perf_counter() - start, "modules": sorted(sys.modules)}))
+"""
+
+def environment(database_url: str) -> dict:
+    return dict(
+        os.environ,
+        SECRET_KEY="startup-test-key",
+        DATABASE_URL=database_url,
+        ENVIRONMENT="production",
+    )
+
+def temp_database() -> tuple[str, str]:
+    path = os.path.join(tempfile.mkdtemp(), "startup.db")
+    return path, f"sqlite:///{path}"
+
+def measure_import() -> dict:
+    path, database_url = temp_database()
+    output = subprocess.check_output([sys.executable, "-c", IMPORT_PROBE], cwd=ROOT, env=environment(database_url))
+    result = json.loads(output.decode().strip().splitlines()[-1])
+    result["database_created"] = os.path.exists(path)
+    return result
+
+def measure_first_ready() -> float:
+    """從啟動 process 到 GET /health/ready 回傳 200 的秒數 (新資料庫，含 migration)"""
+    _, database_url = temp_database()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(PORT), "--log-level", "warning"],
+        cwd=ROOT, env=environment(database_url),
+    )
+    try:
+        while time.perf_counter() - start < 60:
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{PORT}/health/ready", timeout=5) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError):
+                pass
+            time.sleep(0.01)
+        raise RuntimeError("伺服器啟動逾時")
+    finally:
+        server.terminate()
+        server.wait()
+
+def test_import_is_lightweight():
+    result = measure_import()
+    assert result["seconds"] < IMPORT_BUDGET, result["seconds"]
+    # 寄信與 PostgreSQL 專用模組在第一次使用時才載入；匯入時不執行 DDL
+    for module in ("smtplib", "email.mime.text", "sqlalchemy.dialects.postgresql"):
+        assert module not in result["modules"], module
+    assert not result["database_created"]
+
+def test_time_to_first_ready():
+    seconds = measure_first_ready()
+    assert seconds < READY_BUDGET, seconds
+
+def main():
+    imports = [measure_import()["seconds"] for _ in range(RUNS)]
+    ready = [measure_first_ready() for _ in range(RUNS)]
+    print(f"=== 冷啟動 ({RUNS} 次中位數) ===")
+    print(f"import main          {statistics.median(imports) * 1000:8.1f}ms  (最小 {min(imports) * 1000:.1f}ms)")
+    print(f"啟動到第一個 200     {statistics.median(ready) * 1000:8.1f}ms  (最小 {min(ready) * 1000:.1f}ms)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+清除作業測試：過期 / 已使用的密碼重設 token、超過保留期限的 todo tombstone 與不再重試的郵件分批刪除，
+以及資料庫只儲存 token 的 digest、以 digest 查詢 token
+    python -m pytest tests/test_sweeper.py
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+
+# 必須在匯入應用程式模組之前設定 (同一個 pytest process 中已匯入時沿用既有設定)
+os.environ.setdefault("SECRET_KEY", "sweeper-test-key")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'sweeper.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import auth
+import migrations
+from config import settings
+from models import OutboundMail, PasswordResetToken, SessionLocal, Todo, User
+from sweeper import DeadMailSweeper, ResetTokenSweeper, TodoTombstoneSweeper
+
+migrations.upgrade()
+
+@pytest.fixture
+def db():
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+
+def remaining(db, model, ids: list[int]) -> set[int]:
+    db.expire_all()
+    return {row.id for row in db.query(model).filter(model.id.in_(ids))}
+
+def add_reset_token(db, **values) -> PasswordResetToken:
+    token = PasswordResetToken(email="sweeper@example.com", token_hash=auth.hash_reset_token(uuid.uuid4().hex), **values)
+    db.add(token)
+    db.commit()
+    return token
+
+def test_reset_token_sweeper_deletes_expired_and_used(db):
+    now = datetime.utcnow()
+    expired = add_reset_token(db, expires_at=now - timedelta(minutes=1))
+    used = add_reset_token(db, expires_at=now + timedelta(hours=1), used=1)
+    valid = add_reset_token(db, expires_at=now + timedelta(hours=1))
+    ids = [expired.id, used.id, valid.id]
+
+    ResetTokenSweeper().sweep()
+    assert remaining(db, PasswordResetToken, ids) == {valid.id}
+
+def test_sweep_in_batches(db, monkeypatch):
+    monkeypatch.setattr(settings, "sweep_batch_size", 2)
+    ids = [add_reset_token(db, expires_at=datetime.utcnow() - timedelta(minutes=1)).id for _ in range(5)]
+
+    sweeper = ResetTokenSweeper()
+    assert sweeper.sweep() >= 5
+    assert remaining(db, PasswordResetToken, ids) == set()
+    snapshot = sweeper.metrics.snapshot()
+    assert snapshot["runs"] == 1 and snapshot["deleted_total"] >= 5
+
+def test_todo_tombstone_sweeper_respects_retention(db, monkeypatch):
+    monkeypatch.setattr(settings, "todo_tombstone_retention_days", 30)
+    owner = User(email=f"{uuid.uuid4().hex}@example.com", hashed_password="x", name="sweeper")
+    db.add(owner)
+    db.commit()
+    now = datetime.utcnow()
+    old = Todo(title="old", owner_id=owner.id, deleted_at=now - timedelta(days=31))
+    recent = Todo(title="recent", owner_id=owner.id, deleted_at=now - timedelta(days=1))
+    alive = Todo(title="alive", owner_id=owner.id)
+    db.add_all([old, recent, alive])
+    db.commit()
+    ids = [old.id, recent.id, alive.id]
+
+    TodoTombstoneSweeper().sweep()
+    assert remaining(db, Todo, ids) == {recent.id, alive.id}
+
+def test_dead_mail_sweeper_keeps_pending_mail(db, monkeypatch):
+    monkeypatch.setattr(settings, "mail_dead_letter_retention_days", 7)
+    now = datetime.utcnow()
+    dead = OutboundMail(to_email="a@example.com", subject="s", body="", attempts=settings.mail_max_attempts,
+                        next_attempt_at=now - timedelta(days=8))
+    recent_dead = OutboundMail(to_email="a@example.com", subject="s", body="", attempts=settings.mail_max_attempts,
+                               next_attempt_at=now - timedelta(days=1))
+    # 仍在重試的郵件即使 next_attempt_at 很舊也不刪除
+    pending = OutboundMail(to_email="a@example.com", subject="s", body="b", attempts=1,
+                           next_attempt_at=now - timedelta(days=8))
+    db.add_all([dead, recent_dead, pending])
+    db.commit()
+    ids = [dead.id, recent_dead.id, pending.id]
+
+    DeadMailSweeper().sweep()
+    assert remaining(db, OutboundMail, ids) == {recent_dead.id, pending.id}
+
+def test_reset_token_stored_as_digest(db):
+    email = f"{uuid.uuid4().hex}@example.com"
+    db.add(User(email=email, hashed_password="x", name="sweeper"))
+    db.commit()
+    token = auth.create_password_reset_token(email, db)
+
+    row = db.query(PasswordResetToken).filter(PasswordResetToken.email == email).one()
+    assert row.token_hash == auth.hash_reset_token(token)
+    assert len(row.token_hash) == 32 and token.encode() not in row.token_hash
+    # 以原始 token 查詢 (比對 digest) 才找得到，直接拿 digest 當 token 則無效
+    with pytest.raises(HTTPException):
+        auth.consume_reset_token(row.token_hash.hex(), db)
+    assert auth.consume_reset_token(token, db) == email
+    db.commit()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Todo 列表 API 測試：分頁 cursor、排序與篩選條件，以及增量同步 (GET /todos/changes)
+    python -m pytest tests/test_todos_api.py
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+
+# 必須在匯入應用程式模組之前設定 (同一個 pytest process 中已匯入時沿用既有設定，每個測試使用新的用戶)
+os.environ.setdefault("SECRET_KEY", "todos-api-test-key")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'todos_api.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import base64
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from config import settings
+from main import app, encode_sync_token, MAX_ID
+import migrations
+
+# TestClient 未進入 with 區塊時不會執行 lifespan，先建立資料表
+migrations.upgrade()
+client = TestClient(app)
+
+@pytest.fixture
+def headers(monkeypatch) -> dict:
+    """註冊並登入一位新用戶"""
+    monkeypatch.setattr(settings, "rate_limit_enabled", False)
+    user = {"email": f"{uuid.uuid4().hex}@example.com", "password": "123456", "name": "api"}
+    assert client.post("/register", json=user).status_code == 200
+    response = client.post("/login", json={"email": user["email"], "password": user["password"]})
+    return {"Authorization": f"Bearer {response.json()['data']['access_token']}"}
+
+def create(headers: dict, *titles: str) -> list[int]:
+    response = client.post("/todos", json=[{"title": title} for title in titles], headers=headers)
+    assert response.status_code == 200, response.text
+    return [todo["id"] for todo in response.json()["data"]]
+
+def list_todos(headers: dict, **params) -> dict:
+    response = client.get("/todos", params=params, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()
+
+def test_cursor_round_trip(headers):
+    ids = create(headers, *(f"todo {i}" for i in range(5)))
+    seen, cursor = [], None
+    while True:
+        page = list_todos(headers, limit=2, **({"cursor": cursor} if cursor else {}))
+        seen += [todo["id"] for todo in page["data"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+        assert len(page["data"]) == 2
+    assert seen == ids
+
+def test_order_desc(headers):
+    ids = create(headers, "a", "b", "c")
+    page = list_todos(headers, order="desc", limit=2)
+    assert [todo["id"] for todo in page["data"]] == ids[:0:-1]
+    page = list_todos(headers, order="desc", limit=2, cursor=page["next_cursor"])
+    assert [todo["id"] for todo in page["data"]] == ids[:1]
+    assert page["next_cursor"] is None
+
+def test_status_and_title_prefix_filters(headers):
+    ids = create(headers, "buy milk", "buy eggs", "call mom", "100%_done")
+    assert client.patch("/todos/status", params={"ids": ids[1:3]}, json={"status": 1}, headers=headers).status_code == 200
+    assert [todo["title"] for todo in list_todos(headers, status=1)["data"]] == ["buy eggs", "call mom"]
+    assert [todo["title"] for todo in list_todos(headers, title_prefix="buy")["data"]] == ["buy milk", "buy eggs"]
+    assert [todo["title"] for todo in list_todos(headers, status=0, title_prefix="buy")["data"]] == ["buy milk"]
+    # LIKE 的萬用字元照字面比對
+    assert [todo["title"] for todo in list_todos(headers, title_prefix="100%_")["data"]] == ["100%_done"]
+    assert list_todos(headers, title_prefix="1%")["data"] == []
+
+@pytest.mark.parametrize("cursor", [
+    "not-a-cursor",
+    base64.urlsafe_b64encode(b"page:3").decode(),
+    base64.urlsafe_b64encode(b"id:-1").decode(),
+    base64.urlsafe_b64encode(f"id:{MAX_ID + 1}".encode()).decode(),
+])
+def test_invalid_cursor(headers, cursor):
+    response = client.get("/todos", params={"cursor": cursor}, headers=headers)
+    assert response.status_code == 400, response.text
+
+def test_after_id_out_of_range(headers):
+    assert client.get("/todos", params={"after_id": 10**30}, headers=headers).status_code == 422
+    assert client.get("/todos", params={"after_id": MAX_ID}, headers=headers).json()["data"] == []
+
+def changes(headers: dict, since: str | None = None, **params) -> dict:
+    response = client.get("/todos/changes", params={**params, **({"since": since} if since else {})}, headers=headers)
+    assert response.status_code == 200, response.text
+    return response.json()["data"]
+
+def test_changes_returns_upserts_after_write(headers):
+    first = create(headers, "a", "b")
+    full = changes(headers)
+    assert [todo["id"] for todo in full["upserts"]] == first and full["deleted"] == [] and not full["has_more"]
+
+    assert changes(headers, full["next_since"])["upserts"] == []
+    second = create(headers, "c")
+    client.put("/todos", json=[{"id": first[0], "title": "a2"}], headers=headers)
+    delta = changes(headers, full["next_since"])
+    assert [(todo["id"], todo["title"]) for todo in delta["upserts"]] == [(second[0], "c"), (first[0], "a2")]
+    assert changes(headers, delta["next_since"])["upserts"] == []
+
+def test_changes_include_tombstones(headers):
+    ids = create(headers, "a", "b")
+    since = changes(headers)["next_since"]
+    assert client.delete(f"/todos/{ids[0]}", headers=headers).status_code == 200
+    delta = changes(headers, since)
+    assert delta["deleted"] == [ids[0]] and delta["upserts"] == []
+    # 完整同步 (未帶 since) 不回傳 tombstone
+    full = changes(headers)
+    assert [todo["id"] for todo in full["upserts"]] == ids[1:] and full["deleted"] == []
+
+def test_changes_paging(headers):
+    ids = create(headers, *(f"todo {i}" for i in range(5)))
+    seen, since, pages = [], None, 0
+    while True:
+        page = changes(headers, since, limit=2)
+        seen += [todo["id"] for todo in page["upserts"]]
+        since, pages = page["next_since"], pages + 1
+        if not page["has_more"]:
+            break
+    assert seen == ids and pages == 3
+
+def test_changes_expired_token(headers):
+    issued_at = datetime.now() - timedelta(days=settings.todo_tombstone_retention_days + 1)
+    response = client.get("/todos/changes", params={"since": encode_sync_token(0, 0, issued_at)}, headers=headers)
+    assert response.status_code == 410, response.text
+
+@pytest.mark.parametrize("raw", [
+    "not-a-token",
+    "v:1:2",
+    "x:1:2:3",
+    "v:a:2:3",
+    f"v:{MAX_ID + 1}:0:0",
+    "v:0:-1:0",
+    # fromtimestamp 超出範圍
+    f"v:0:0:{10**20}",
+    f"v:0:0:{-10**20}",
+])
+def test_changes_malformed_token(headers, raw):
+    token = base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+    response = client.get("/todos/changes", params={"since": token}, headers=headers)
+    assert response.status_code == 400, response.text